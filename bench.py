@@ -0,0 +1,340 @@
+import argparse
+import gc
+import hashlib
+import json
+import random
+import threading
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from main import (
+    Acme, Amenities, Hotel, HotelsService, Image, Images, Location, Paperflies, Patagonia,
+    hotel_to_dict, make_session,
+)
+
+AMENITIES = ["Pool", "WiFi", "Aircon", "TV", "Coffee machine", "Kettle", "Hair dryer", "Iron", "Business center",
+             "Childcare", "Dry cleaning", "Breakfast", "Bar", "Outdoor pool", "Indoor pool", "Parking"]
+CAPTIONS = ["Double room", "Deluxe room", "Twin room", "Lobby", "Gym", "Bar", "Pool", "Front", "Restaurant"]
+CITIES = [("Singapore", "SG"), ("Tokyo", "JP"), ("Paris", "FR"), ("London", "GB"), ("Sydney", "AU"), ("Hanoi", "VN")]
+IMAGE_PREFIX = "https://d2ey9sqrvkqdfs.cloudfront.net/"
+
+
+# Dict-backed copies of the models, kept only to measure what __slots__ saves
+@dataclass
+class DictLocation:
+    lat: float = None
+    lng: float = None
+    address: str = None
+    city: str = None
+    country: str = None
+
+
+@dataclass
+class DictAmenities:
+    general: list = field(default_factory=list)
+    room: list = field(default_factory=list)
+
+
+@dataclass
+class DictImage:
+    link: str
+    description: str
+
+
+@dataclass
+class DictImages:
+    rooms: list = field(default_factory=list)
+    site: list = field(default_factory=list)
+    amenities: list = field(default_factory=list)
+
+
+@dataclass
+class DictHotel:
+    id: str
+    source: str
+    destination_id: int
+    name: str
+    location: DictLocation = field(default_factory=DictLocation)
+    description: str = ""
+    amenities: DictAmenities = field(default_factory=DictAmenities)
+    images: DictImages = field(default_factory=DictImages)
+    booking_conditions: list = field(default_factory=list)
+
+
+def generate_payloads(hotels=1000, overlap=0.5, destinations=None, seed=0):
+    """Supplier-shaped payloads for a synthetic catalog.
+
+    Every hotel is listed by one supplier and by each other supplier with probability overlap.
+    """
+    rng = random.Random(seed)
+    destinations = destinations or max(1, hotels // 50)
+    payloads = {"acme": [], "patagonia": [], "paperflies": []}
+    names = list(payloads)
+    for i in range(hotels):
+        hotel_id = f"{i:07x}"
+        destination_id = 1000 + rng.randrange(destinations)
+        city, country = rng.choice(CITIES)
+        lat, lng = rng.uniform(-60, 60), rng.uniform(-180, 180)
+        home = rng.choice(names)
+        images = [(f"{IMAGE_PREFIX}{hotel_id}/{n}.jpg", rng.choice(CAPTIONS)) for n in range(rng.randrange(1, 6))]
+        amenities = rng.sample(AMENITIES, rng.randrange(2, 8))
+        for name in names:
+            if name != home and rng.random() >= overlap:
+                continue
+            if name == "acme":
+                payloads[name].append({
+                    "Id": hotel_id, "DestinationId": destination_id, "Name": f"Hotel {hotel_id}",
+                    "Latitude": lat, "Longitude": lng, "Address": f" {i} Main Street ", "City": city,
+                    "Country": country, "PostalCode": f"{rng.randrange(100000):06d} ",
+                    "Description": f" A hotel in {city}. ", "Facilities": amenities,
+                })
+            elif name == "patagonia":
+                payloads[name].append({
+                    "id": hotel_id, "destination": destination_id, "name": f"Hotel {hotel_id}",
+                    "lat": lat, "lng": lng, "address": f"{i} Main Street, {city}", "info": f"Stay in {city}.",
+                    "amenities": [amenity.lower() for amenity in amenities],
+                    "images": {
+                        "rooms": [{"url": url, "description": caption} for url, caption in images[:2]],
+                        "amenities": [{"url": url, "description": caption} for url, caption in images[2:]],
+                    },
+                })
+            else:
+                payloads[name].append({
+                    "hotel_id": hotel_id, "destination_id": destination_id, "hotel_name": f"Hotel {hotel_id}",
+                    "location": {"address": f"{i} Main Street", "country": city},
+                    "details": f"Welcome to {city}.",
+                    "amenities": {"general": amenities[:3], "room": amenities[3:]},
+                    "images": {
+                        "rooms": [{"link": url, "caption": caption} for url, caption in images[:3]],
+                        "site": [{"link": url, "caption": caption} for url, caption in images[3:]],
+                    },
+                    "booking_conditions": ["Pets are not allowed.", "Check-in from 3pm."],
+                })
+    return payloads
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        name = url.path.rstrip("/").rsplit("/", 1)[-1]
+        body = self.server.bodies.get(name)
+        query = parse_qs(url.query)
+        if body is not None and "limit" in query:
+            # page/limit and offset/limit pagination, 1-based pages like mockapi
+            limit = int(query["limit"][0])
+            if "page" in query:
+                start = (int(query["page"][0]) - 1) * limit
+            else:
+                start = int(query.get("offset", ["0"])[0])
+            body = json.dumps(self.server.payloads[name][start:start + limit]).encode()
+        if body is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        etag = '"%s"' % hashlib.sha256(body).hexdigest()[:16]
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stand_in(payloads):
+    """Serve payloads at http://127.0.0.1:<port>/suppliers/<name> from a background thread"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    server.daemon_threads = True
+    server.payloads = payloads
+    server.bodies = {name: json.dumps(dtos).encode() for name, dtos in payloads.items()}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def stand_in_suppliers(server, session=None, page_size=None):
+    """The real suppliers with their endpoints pointed at the stand-in server"""
+    base = f"http://127.0.0.1:{server.server_port}/suppliers"
+    suppliers = []
+    for cls, name in [(Acme, "acme"), (Patagonia, "patagonia"), (Paperflies, "paperflies")]:
+        attrs = {"endpoint": staticmethod(lambda url=f"{base}/{name}": url)}
+        if page_size:
+            attrs.update(pagination="page", page_size=page_size)
+        local = type(cls.__name__, (cls,), attrs)
+        suppliers.append(local(session))
+    return suppliers
+
+
+class Stage:
+    """Times one pipeline stage: overall throughput, per-sample latency and traced peak memory"""
+
+    def __init__(self, name, trace_memory):
+        self.name = name
+        self.trace_memory = trace_memory
+        self.samples = []
+        self.items = 0
+
+    def __enter__(self):
+        gc.collect()
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            self.start_memory = tracemalloc.get_traced_memory()[0]
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
+        self.peak = tracemalloc.get_traced_memory()[1] - self.start_memory if self.trace_memory else None
+
+    def time(self, fn, *args, items=1):
+        start = time.perf_counter()
+        result = fn(*args)
+        self.samples.append(time.perf_counter() - start)
+        self.items += items
+        return result
+
+    def row(self):
+        samples = sorted(self.samples)
+
+        def pct(p):
+            return samples[min(len(samples) - 1, int(len(samples) * p / 100))] * 1000 if samples else 0.0
+
+        peak = f"{self.peak / 2**20:.1f}" if self.peak is not None else "-"
+        rate = self.items / self.elapsed if self.elapsed else float("inf")
+        return (f"{self.name:<10} {self.items:>10} {self.elapsed:>9.3f} {rate:>12.0f} "
+                f"{pct(50):>9.3f} {pct(95):>9.3f} {pct(99):>9.3f} {peak:>9}")
+
+
+def fetch_dtos(supplier):
+    if supplier.pagination is not None:
+        return [dto for page in supplier.iter_pages() for dto in page]
+    return supplier.session.get(supplier.endpoint(), timeout=supplier.timeout).json()
+
+
+def random_queries(rng, hotel_ids, destination_ids, count, size):
+    queries = []
+    for i in range(count):
+        kind = i % 3
+        ids = rng.sample(hotel_ids, min(size, len(hotel_ids))) if kind != 1 else None
+        destinations = rng.sample(destination_ids, min(size, len(destination_ids))) if kind != 0 else None
+        queries.append((ids, destinations))
+    return queries
+
+
+def bench_pipeline(hotels, overlap, queries, query_size, batch, trace_memory, seed, page_size=None):
+    payloads = generate_payloads(hotels, overlap, seed=seed)
+    records = sum(len(dtos) for dtos in payloads.values())
+    print(f"{hotels} hotels, {records} supplier records, overlap {overlap}")
+    server = start_stand_in(payloads)
+    suppliers = stand_in_suppliers(server, make_session(), page_size)
+    if trace_memory:
+        tracemalloc.start()
+    stages = []
+    try:
+        with Stage("fetch", trace_memory) as stage:
+            dtos = [stage.time(fetch_dtos, supplier) for supplier in suppliers]
+        stages.append(stage)
+
+        with Stage("parse", trace_memory) as stage:
+            parsed = [[stage.time(supplier.parse, dto) for dto in supplier_dtos]
+                      for supplier, supplier_dtos in zip(suppliers, dtos)]
+        stages.append(stage)
+        del dtos
+
+        svc = HotelsService()
+        with Stage("merge", trace_memory) as stage:
+            for supplier_hotels in parsed:
+                for start in range(0, len(supplier_hotels), batch):
+                    chunk = supplier_hotels[start:start + batch]
+                    stage.time(svc.merge_and_save, chunk, items=len(chunk))
+        stages.append(stage)
+        del parsed
+
+        rng = random.Random(seed)
+        hotel_ids = list(svc.hotels)
+        destination_ids = sorted({hotel.destination_id for hotel in svc.hotels.values()})
+        with Stage("find", trace_memory) as stage:
+            for hotel_ids_query, destination_ids_query in random_queries(rng, hotel_ids, destination_ids, queries, query_size):
+                stage.time(svc.find, hotel_ids_query, destination_ids_query)
+        stages.append(stage)
+
+        with Stage("serialize", trace_memory) as stage:
+            for hotel in svc.hotels.values():
+                stage.time(lambda h: json.dumps(hotel_to_dict(h)), hotel)
+        stages.append(stage)
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+        server.shutdown()
+
+    print(f"{'stage':<10} {'items':>10} {'seconds':>9} {'items/s':>12} "
+          f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'peak MB':>9}")
+    for stage in stages:
+        print(stage.row())
+
+
+def measure(build, count):
+    """Bytes allocated per object while building count objects"""
+    gc.collect()
+    tracemalloc.start()
+    objects = [build(i) for i in range(count)]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    # The list holding the objects is the same for both variants, so leave it out
+    size -= objects.__sizeof__()
+    del objects
+    return size / count
+
+
+def bench_memory(count):
+    link, description = "https://example.com/image.jpg", "Double room"
+    cases = [
+        ("Image", lambda i: Image(link, description), lambda i: DictImage(link, description)),
+        ("Location", lambda i: Location(1.0, 2.0, "addr", "city", "SG"), lambda i: DictLocation(1.0, 2.0, "addr", "city", "SG")),
+        ("Amenities", lambda i: Amenities(), lambda i: DictAmenities()),
+        ("Images", lambda i: Images(), lambda i: DictImages()),
+        ("Hotel", lambda i: Hotel("id", "Acme", 1, "name"), lambda i: DictHotel("id", "Acme", 1, "name")),
+    ]
+    print(f"{'class':<10} {'slots B/obj':>12} {'dict B/obj':>12} {'saved':>8}")
+    for name, slotted, plain in cases:
+        slotted_size = measure(slotted, count)
+        plain_size = measure(plain, count)
+        saved = 1 - slotted_size / plain_size
+        print(f"{name:<10} {slotted_size:>12.1f} {plain_size:>12.1f} {saved:>8.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("benchmark", choices=["pipeline", "memory"], help="Benchmark to run")
+    parser.add_argument("--count", type=int, default=100_000, help="Objects built per memory measurement")
+    parser.add_argument("--hotels", type=int, default=10_000, help="Hotels in the synthetic catalog")
+    parser.add_argument("--overlap", type=float, default=0.5, help="Chance a hotel is also listed by each other supplier")
+    parser.add_argument("--queries", type=int, default=1000, help="find() calls to time")
+    parser.add_argument("--query-size", type=int, default=10, help="Ids per find() query")
+    parser.add_argument("--batch", type=int, default=1000, help="Records per merge_and_save call")
+    parser.add_argument("--no-memory", action="store_true", help="Skip tracemalloc, which slows every stage down")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the data generator and queries")
+    parser.add_argument("--page-size", type=int, help="Fetch the stand-in catalog in pages of this size")
+    args = parser.parse_args()
+    if args.benchmark == "pipeline":
+        bench_pipeline(args.hotels, args.overlap, args.queries, args.query_size, args.batch,
+                       not args.no_memory, args.seed, args.page_size)
+    elif args.benchmark == "memory":
+        bench_memory(args.count)
+
+
+if __name__ == "__main__":
+    main()
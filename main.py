@@ -1,10 +1,37 @@
 from dataclasses import dataclass, field
 import json
+import math
+from array import array
 import argparse
+import asyncio
+import bisect
+import codecs
+import copy
+import gzip
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+from collections import deque
+from collections.abc import MutableMapping
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
+try:
+    import numpy as np
+except ImportError:  # ColumnarCatalog falls back to array columns and Python loops
+    np = None
 
-@dataclass
+
+@dataclass(slots=True)
 class Location:
     lat: float = None
     lng: float = None
@@ -13,26 +40,26 @@ class Location:
     country: str = None
 
 
-@dataclass
+@dataclass(slots=True)
 class Amenities:
     general: list = field(default_factory=list)
     room: list = field(default_factory=list)
 
 
-@dataclass
+@dataclass(slots=True)
 class Image:
     link: str
     description: str
 
 
-@dataclass
+@dataclass(slots=True)
 class Images:
     rooms: list[Image] = field(default_factory=list)
     site: list[Image] = field(default_factory=list)
     amenities: list[Image] = field(default_factory=list)
 
 
-@dataclass
+@dataclass(slots=True)
 class Hotel:
     id: str
     source:str
@@ -45,7 +72,280 @@ class Hotel:
     booking_conditions: list[str] = field(default_factory=list)
 
 
+class Vocabulary:
+    """One shared str object per distinct amenity, caption, city, country or booking condition.
+
+    Parsers route these repetitive strings through here so millions of hotels point at a handful of
+    objects, and set/dict dedup while merging hits the cached hash and an identity comparison.
+    Once limit distinct terms are held the table starts over, so a long-running server that keeps
+    seeing new captions doesn't grow it without bound.
+    """
+
+    def __init__(self, limit=1 << 16):
+        self.limit = limit
+        self._terms = {}
+
+    def __call__(self, value):
+        if value is None:
+            return None
+        term = self._terms.get(value)
+        if term is None:
+            if len(self._terms) >= self.limit:
+                self._terms.clear()
+            term = self._terms.setdefault(value, value)
+        return term
+
+    def __len__(self):
+        return len(self._terms)
+
+
+VOCABULARY = Vocabulary()
+
+
+def make_session(pool_size=10, retries=3, backoff_factor=0.5):
+    """Keep-alive session shared by suppliers so repeated fetches reuse their connections"""
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(["GET"]),
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+_default_session = None
+
+
+def default_session():
+    global _default_session
+    if _default_session is None:
+        _default_session = make_session()
+    return _default_session
+
+
+def iter_json_array(chunks):
+    """Yield the elements of a top-level JSON array as its bytes arrive, without holding the whole document"""
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    expect = "["
+    chunks = iter(chunks)
+    exhausted = False
+    while True:
+        pos = 0
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n":
+                pos += 1
+            if pos == len(buffer):
+                break
+            char = buffer[pos]
+            if expect == "[":
+                if char != "[":
+                    raise ValueError("Supplier payload is not a JSON array")
+                expect, pos = "value or ]", pos + 1
+            elif expect in ("value or ]", ", or ]") and char == "]":
+                return
+            elif expect == ", or ]":
+                if char != ",":
+                    raise ValueError(f"Expected ',' or ']' in supplier payload, got {char!r}")
+                expect, pos = "value", pos + 1
+            else:
+                try:
+                    value, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if exhausted:
+                        raise
+                    break
+                # A number cut at a chunk boundary still decodes, so wait for the byte that ends it
+                if char in "-0123456789" and not exhausted and (end == len(buffer) or buffer[end] not in ", \t\r\n]"):
+                    break
+                yield value
+                expect, pos = ", or ]", end
+        buffer = buffer[pos:]
+        if exhausted:
+            raise ValueError("Supplier payload ended before the JSON array was closed")
+        chunk = next(chunks, None)
+        if chunk is None:
+            exhausted = True
+            buffer += text.decode(b"", final=True)
+        else:
+            buffer += text.decode(chunk)
+
+
+class SupplierCache:
+    """On-disk cache of raw supplier responses, stored gzip-compressed and keyed by endpoint.
+
+    Only the payload is kept; hotels are parsed from it again on every hit, so parser changes apply at once.
+    """
+
+    # Bump whenever the files written here change; entries written by another version are refetched
+    version = 2
+
+    def __init__(self, directory=".supplier_cache"):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, url, suffix):
+        key = hashlib.sha256(url.encode()).hexdigest()[:32]
+        return os.path.join(self.directory, key + suffix)
+
+    def _write(self, path, data):
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _load_meta(self, url):
+        try:
+            with open(self._path(url, ".meta.json")) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return meta if meta.get("version") == self.version else None
+
+    def _save_meta(self, url, meta):
+        self._write(self._path(url, ".meta.json"), json.dumps(meta).encode())
+
+    def _readable(self, url):
+        try:
+            with gzip.open(self._path(url, ".json.gz"), "rb") as f:
+                f.read(1)
+            return True
+        except (OSError, EOFError, zlib.error):
+            return False
+
+    def _iter_dtos(self, url):
+        # Decompress straight into the incremental JSON parser instead of inflating the whole body first
+        with gzip.open(self._path(url, ".json.gz"), "rb") as f:
+            yield from iter_json_array(iter(lambda: f.read(64 * 1024), b""))
+
+    def _saved(self, url, resp):
+        self._save_meta(url, {
+            "version": self.version,
+            "url": url,
+            "fetched_at": time.time(),
+            "etag": resp.headers.get("ETag"),
+            "last_modified": resp.headers.get("Last-Modified"),
+        })
+        # Version 1 entries also kept a pickle of the parsed hotels
+        try:
+            os.remove(self._path(url, ".hotels.pickle"))
+        except FileNotFoundError:
+            pass
+
+    def _response(self, supplier, stream):
+        """None when the cached body can be served, otherwise a 200 response carrying a new body"""
+        url = supplier.endpoint()
+        meta = self._load_meta(url)
+        if meta and time.time() - meta["fetched_at"] < supplier.ttl and self._readable(url):
+            return None
+
+        headers = {}
+        if meta and meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta and meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        resp = supplier.session.get(url, headers=headers, timeout=supplier.timeout, stream=stream)
+
+        if resp.status_code == 304 and meta:
+            resp.close()
+            if self._readable(url):
+                meta["fetched_at"] = time.time()
+                self._save_meta(url, meta)
+                return None
+            # Nothing on disk to revalidate, so ask again without validators
+            resp = supplier.session.get(url, timeout=supplier.timeout, stream=stream)
+        resp.raise_for_status()
+        return resp
+
+    def fetch(self, supplier):
+        """The supplier's raw records, from disk while fresh or confirmed unchanged by a conditional GET"""
+        url = supplier.endpoint()
+        resp = self._response(supplier, stream=False)
+        if resp is None:
+            return list(self._iter_dtos(url))
+        body = resp.content
+        self._write(self._path(url, ".json.gz"), gzip.compress(body))
+        self._saved(url, resp)
+        return json.loads(body)
+
+    def iter_fetch(self, supplier):
+        """fetch() one record at a time; a new body is parsed and compressed to disk as it downloads"""
+        url = supplier.endpoint()
+        resp = self._response(supplier, stream=True)
+        if resp is None:
+            yield from self._iter_dtos(url)
+            return
+        path = self._path(url, ".json.gz")
+        tmp = path + ".tmp"
+        with resp, gzip.open(tmp, "wb") as f:
+            def chunks():
+                for chunk in resp.iter_content(supplier.chunk_size):
+                    f.write(chunk)
+                    yield chunk
+
+            body = chunks()
+            try:
+                yield from iter_json_array(body)
+                # Keep whatever follows the closing bracket so the cached body is byte-identical
+                for _ in body:
+                    pass
+            except BaseException:
+                # A failed or abandoned download leaves the previous entry in place
+                f.close()
+                os.remove(tmp)
+                raise
+        os.replace(tmp, path)
+        self._saved(url, resp)
+
+
+class HotelQuery:
+    """The supplier records a find() call can return, so the others can be dropped before merging.
+
+    Records are kept by hotel id, so every record of a requested hotel survives and merges as before.
+    Destination-only lookups keep records by destination_id, which assumes suppliers agree on a
+    hotel's destination.
+    """
+
+    def __init__(self, hotel_ids=None, destination_ids=None):
+        self.hotel_ids = set(hotel_ids or ())
+        # Paired lookups only fall back to a destination once the hotel ids run out
+        self.destination_ids = set(destination_ids[len(hotel_ids or ()):]) if destination_ids else set()
+
+    @classmethod
+    def for_find(cls, hotel_ids, destination_ids):
+        if hotel_ids is None and destination_ids is None:
+            return None
+        return cls(hotel_ids, destination_ids)
+
+    def matches(self, hotel_id, destination_id):
+        return hotel_id in self.hotel_ids or destination_id in self.destination_ids
+
+
 class BaseSupplier:
+    timeout = 10
+    ttl = 300
+    chunk_size = 64 * 1024
+    # Suppliers with a lower priority are merged first, so they win name, destination and description
+    priority = None
+    # None for a single-response catalog, otherwise "page", "offset" or "cursor"
+    pagination = None
+    page_size = 100
+    first_page = 1
+    page_window = 4
+    page_param = "page"
+    offset_param = "offset"
+    limit_param = "limit"
+    cursor_param = "cursor"
+
+    def __init__(self, session=None, cache=None):
+        self.session = session or default_session()
+        self.cache = cache
+
     @staticmethod
     def endpoint():
         """URL to fetch supplier data"""
@@ -54,17 +354,115 @@ class BaseSupplier:
     def parse(data: dict) -> Hotel:
         """Parse supplier-provided data into Hotel object"""
 
-    def fetch(self):
-        url = self.endpoint()
-        resp = requests.get(url)
-        return [self.parse(dto) for dto in resp.json()]
+    @staticmethod
+    def keys(data: dict):
+        """Hotel id and destination id of supplier-provided data, read without parsing it"""
+
+    def query_params(self, query: HotelQuery):
+        """Request parameters that make the supplier filter by query, or None if its API can't"""
+        return None
+
+    def _select(self, dtos, query):
+        if query is None:
+            return dtos
+        return [dto for dto in dtos if query.matches(*self.keys(dto))]
+
+    def parse_all(self, dtos):
+        return [self.parse(dto) for dto in dtos]
+
+    @staticmethod
+    def page_items(payload):
+        """Records in one page of a paginated response"""
+        return payload
+
+    @staticmethod
+    def next_cursor(payload):
+        """Cursor for the page after this one, or None on the last page"""
+        return payload.get("next_cursor") if isinstance(payload, dict) else None
+
+    def _get_page(self, params):
+        resp = self.session.get(self.endpoint(), params=params, timeout=self.timeout)
+        resp.raise_for_status()
+        return resp.json()
+
+    def iter_pages(self, params=None):
+        """Yield each page's records in order; numbered pages are prefetched page_window at a time"""
+        params = dict(params or {}, **{self.limit_param: self.page_size})
+        if self.pagination == "cursor":
+            cursor = None
+            while True:
+                payload = self._get_page(params if cursor is None else dict(params, **{self.cursor_param: cursor}))
+                yield self.page_items(payload)
+                cursor = self.next_cursor(payload)
+                if not cursor:
+                    return
+
+        def page_params(n):
+            if self.pagination == "page":
+                return dict(params, **{self.page_param: self.first_page + n})
+            return dict(params, **{self.offset_param: n * self.page_size})
+
+        with ThreadPoolExecutor(self.page_window) as pool:
+            pending = deque(pool.submit(self._get_page, page_params(n)) for n in range(self.page_window))
+            next_page = self.page_window
+            while pending:
+                items = self.page_items(pending.popleft().result())
+                # A short page is the last one, so pages requested after it are not needed
+                if len(items) < self.page_size:
+                    for future in pending:
+                        future.cancel()
+                    pending.clear()
+                else:
+                    pending.append(pool.submit(self._get_page, page_params(next_page)))
+                    next_page += 1
+                if items:
+                    yield items
+
+    def fetch(self, query: HotelQuery = None):
+        # The cache holds the whole catalog so it can answer any query
+        if self.cache is not None and self.pagination is None:
+            return self.parse_all(self._select(self.cache.fetch(self), query))
+        params = self.query_params(query) if query is not None else None
+        if self.pagination is not None:
+            hotels = []
+            for page in self.iter_pages(params):
+                hotels.extend(self.parse_all(self._select(page, query)))
+            return hotels
+        resp = self.session.get(self.endpoint(), params=params, timeout=self.timeout)
+        resp.raise_for_status()
+        return self.parse_all(self._select(resp.json(), query))
+
+    def iter_fetch(self, query: HotelQuery = None):
+        """Yield hotels one at a time while the supplier response is still downloading"""
+        if self.pagination is not None:
+            params = self.query_params(query) if query is not None else None
+            dtos = (dto for page in self.iter_pages(params) for dto in page)
+        elif self.cache is not None:
+            # Cached bodies hold the whole catalog, so the query is applied to the records instead
+            dtos = self.cache.iter_fetch(self)
+        else:
+            dtos = self._iter_response(self.query_params(query) if query is not None else None)
+        for dto in dtos:
+            if query is None or query.matches(*self.keys(dto)):
+                yield self.parse(dto)
+
+    def _iter_response(self, params):
+        with self.session.get(self.endpoint(), params=params, timeout=self.timeout, stream=True) as resp:
+            resp.raise_for_status()
+            yield from iter_json_array(resp.iter_content(self.chunk_size))
 
 
 class Acme(BaseSupplier):
+    priority = 0
+
     @staticmethod
     def endpoint():
         return 'https://5f2be0b4ffc88500167b85a0.mockapi.io/suppliers/acme'
 
+    @staticmethod
+    def keys(dto: dict):
+        return dto['Id'], dto['DestinationId']
+
     @staticmethod
     def parse(dto: dict) -> Hotel:
         return Hotel(
@@ -77,8 +475,8 @@ class Acme(BaseSupplier):
                 lat=dto.get('Latitude'),
                 lng=dto.get('Longitude'),
                 address=f"{dto.get('Address', '').strip()}, {dto.get('PostalCode', '').strip()}",
-                city=dto.get('City'),
-                country=dto.get('Country')
+                city=VOCABULARY(dto.get('City')),
+                country=VOCABULARY(dto.get('Country'))
             ),
             # amenities=Amenities(
             #     general=[facility.strip().lower() for facility in dto.get('Facilities', [])]
@@ -87,10 +485,16 @@ class Acme(BaseSupplier):
 
 
 class Patagonia(BaseSupplier):
+    priority = 1
+
     @staticmethod
     def endpoint():
         return 'https://5f2be0b4ffc88500167b85a0.mockapi.io/suppliers/patagonia'
 
+    @staticmethod
+    def keys(dto: dict):
+        return dto['id'], dto['destination']
+
     @staticmethod
     def parse(dto: dict) -> Hotel:
         return Hotel(
@@ -108,17 +512,23 @@ class Patagonia(BaseSupplier):
             #     room=[amenity.lower() for amenity in (dto.get('amenities') or [])]
             # ),
             images=Images(
-                rooms=[Image(link=image['url'], description=image['description']) for image in dto['images'].get('rooms', [])],
-                amenities=[Image(link=image['url'], description=image['description']) for image in dto['images'].get('amenities', [])]
+                rooms=[Image(link=image['url'], description=VOCABULARY(image['description'])) for image in dto['images'].get('rooms', [])],
+                amenities=[Image(link=image['url'], description=VOCABULARY(image['description'])) for image in dto['images'].get('amenities', [])]
             )
         )
 
 
 class Paperflies(BaseSupplier):
+    priority = 2
+
     @staticmethod
     def endpoint():
         return 'https://5f2be0b4ffc88500167b85a0.mockapi.io/suppliers/paperflies'
 
+    @staticmethod
+    def keys(dto: dict):
+        return dto['hotel_id'], dto['destination_id']
+
     @staticmethod
     def parse(dto: dict) -> Hotel:
         location_data = dto.get('location', {})
@@ -130,33 +540,395 @@ class Paperflies(BaseSupplier):
             description=dto.get('details', ""),
             location=Location(
                 address=location_data.get('address'),
-                country=location_data.get('country')
+                country=VOCABULARY(location_data.get('country'))
             ),
             amenities=Amenities(
-                general=[amenity.lower() for amenity in dto.get('amenities', {}).get('general', [])],
-                room=[amenity.lower() for amenity in dto.get('amenities', {}).get('room', [])]
+                general=[VOCABULARY(amenity.lower()) for amenity in dto.get('amenities', {}).get('general', [])],
+                room=[VOCABULARY(amenity.lower()) for amenity in dto.get('amenities', {}).get('room', [])]
             ),
             images=Images(
-                rooms=[Image(link=image['link'], description=image['caption']) for image in dto['images'].get('rooms', [])],
-                site=[Image(link=image['link'], description=image['caption']) for image in dto['images'].get('site', [])]
+                rooms=[Image(link=image['link'], description=VOCABULARY(image['caption'])) for image in dto['images'].get('rooms', [])],
+                site=[Image(link=image['link'], description=VOCABULARY(image['caption'])) for image in dto['images'].get('site', [])]
             ),
-            booking_conditions=dto.get('booking_conditions', [])
+            booking_conditions=[VOCABULARY(condition) for condition in dto.get('booking_conditions', [])]
         )
 
 
+class MergeAccumulator:
+    """Insertion-ordered sets for a hotel's list fields while supplier records are merged into it"""
+
+    def __init__(self, hotel: Hotel):
+        self.general = dict.fromkeys(hotel.amenities.general)
+        self.room = dict.fromkeys(hotel.amenities.room)
+        self.rooms = self._images(hotel.images.rooms)
+        self.site = self._images(hotel.images.site)
+        self.image_amenities = self._images(hotel.images.amenities)
+        self.booking_conditions = dict.fromkeys(hotel.booking_conditions)
+
+    @staticmethod
+    def _images(images):
+        return {(image.link, image.description): image for image in images}
+
+    def add(self, hotel: Hotel):
+        self.general.update(dict.fromkeys(hotel.amenities.general))
+        self.room.update(dict.fromkeys(hotel.amenities.room))
+        self.rooms.update(self._images(hotel.images.rooms))
+        self.site.update(self._images(hotel.images.site))
+        self.image_amenities.update(self._images(hotel.images.amenities))
+        self.booking_conditions.update(dict.fromkeys(hotel.booking_conditions))
+        return self
+
+    def freeze_into(self, hotel: Hotel):
+        hotel.amenities.general = list(self.general)
+        hotel.amenities.room = list(self.room)
+        hotel.images.rooms = list(self.rooms.values())
+        hotel.images.site = list(self.site.values())
+        hotel.images.amenities = list(self.image_amenities.values())
+        hotel.booking_conditions = list(self.booking_conditions)
+
+
+class MergedHotels(MutableMapping):
+    """Hotel id -> merged Hotel; entries invalidated to None are merged again on first access"""
+
+    def __init__(self, materialize):
+        self._hotels = {}
+        self._materialize = materialize
+
+    def __getitem__(self, hotel_id):
+        hotel = self._hotels[hotel_id]
+        if hotel is None:
+            hotel = self._hotels[hotel_id] = self._materialize(hotel_id)
+        return hotel
+
+    def __setitem__(self, hotel_id, hotel):
+        self._hotels[hotel_id] = hotel
+
+    def __delitem__(self, hotel_id):
+        del self._hotels[hotel_id]
+
+    def __contains__(self, hotel_id):
+        return hotel_id in self._hotels
+
+    def __iter__(self):
+        return iter(self._hotels)
+
+    def __len__(self):
+        return len(self._hotels)
+
+    def invalidate(self, hotel_id):
+        self._hotels[hotel_id] = None
+
+
+# Snapshot layout, all integers little-endian and every section padded to 8 bytes:
+#   header                magic, format version, hotel count
+#   section table         (start, length) of each section below
+#   id_offsets            u64 per hotel plus one: where each id starts in ids
+#   ids                   the hotel ids, each followed by a NUL
+#   destinations          i64 per hotel, SNAPSHOT_NO_DESTINATION for a missing destination_id
+#   record_offsets        u64 per hotel plus one, delimiting each record in records
+#   id_order              u64 hotel positions sorted by id, for binary search
+#   destination_values    i64 distinct destinations, sorted
+#   destination_starts    u64 per destination plus one, delimiting its hotels in destination_postings
+#   destination_postings  u64 hotel positions grouped by destination, in catalog order
+#   records               one compact JSON object per hotel, in hotel_to_dict layout
+# Hotels are stored in catalog order, so a hotel's position is also its record number.
+SNAPSHOT_MAGIC = b"HOTELCAT"
+SNAPSHOT_VERSION = 2
+SNAPSHOT_HEADER = struct.Struct("<8sH6xQ")
+SNAPSHOT_SECTIONS = (
+    "id_offsets", "ids", "destinations", "record_offsets", "id_order",
+    "destination_values", "destination_starts", "destination_postings", "records",
+)
+SNAPSHOT_TABLE = struct.Struct("<%dQ" % (2 * len(SNAPSHOT_SECTIONS)))
+SNAPSHOT_NO_DESTINATION = -2**63
+
+
+def little_endian(values):
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def write_snapshot(path, hotels):
+    ids = []
+    destinations = array("q")
+    record_offsets = array("Q", [0])
+    records = []
+    size = 0
+    for hotel in hotels:
+        ids.append(hotel.id.encode())
+        destinations.append(SNAPSHOT_NO_DESTINATION if hotel.destination_id is None else hotel.destination_id)
+        record = json.dumps(hotel_to_dict(hotel), separators=(",", ":")).encode()
+        records.append(record)
+        size += len(record)
+        record_offsets.append(size)
+
+    id_offsets = array("Q", [0])
+    for hotel_id in ids:
+        id_offsets.append(id_offsets[-1] + len(hotel_id) + 1)
+    by_destination = {}
+    for position, destination_id in enumerate(destinations):
+        by_destination.setdefault(destination_id, []).append(position)
+    destination_values = array("q", sorted(by_destination))
+    destination_starts = array("Q", [0])
+    destination_postings = array("Q")
+    for destination_id in destination_values:
+        destination_postings.extend(by_destination[destination_id])
+        destination_starts.append(len(destination_postings))
+
+    sections = [
+        little_endian(id_offsets).tobytes(),
+        b"".join(hotel_id + b"\0" for hotel_id in ids),
+        little_endian(destinations).tobytes(),
+        little_endian(record_offsets).tobytes(),
+        little_endian(array("Q", sorted(range(len(ids)), key=ids.__getitem__))).tobytes(),
+        little_endian(destination_values).tobytes(),
+        little_endian(destination_starts).tobytes(),
+        little_endian(destination_postings).tobytes(),
+        b"".join(records),
+    ]
+    table = []
+    start = SNAPSHOT_HEADER.size + SNAPSHOT_TABLE.size
+    for section in sections:
+        table += [start, len(section)]
+        start += -(-len(section) // 8) * 8
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(ids)))
+        f.write(SNAPSHOT_TABLE.pack(*table))
+        for section in sections:
+            f.write(section)
+            f.write(b"\0" * (-len(section) % 8))
+    os.replace(tmp, path)
+
+
+def open_snapshot(path):
+    """Memory-map a snapshot file; returns the mapping, the hotel count and a memoryview per section"""
+    with open(path, "rb") as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, count = SNAPSHOT_HEADER.unpack_from(data)
+    if magic != SNAPSHOT_MAGIC:
+        raise ValueError(f"{path} is not a hotels snapshot")
+    if version != SNAPSHOT_VERSION:
+        raise ValueError(f"{path} has snapshot version {version}, expected {SNAPSHOT_VERSION}")
+    table = SNAPSHOT_TABLE.unpack_from(data, SNAPSHOT_HEADER.size)
+    view = memoryview(data)
+    sections = {
+        name: view[table[2 * i]:table[2 * i] + table[2 * i + 1]] for i, name in enumerate(SNAPSHOT_SECTIONS)
+    }
+    return data, count, sections
+
+
+def find_pairs(hotel_ids, destination_ids, locate, first_in, destination_of):
+    """Paired find() lookups over any catalog; returns the keys located for each pair, in query order.
+
+    Pair i is hotel_ids[i], dropped unless it lies in destination_ids[i] when that is given, or once the
+    hotel ids run out the first hotel in destination_ids[i]. locate and first_in return a key or None.
+    """
+    found = []
+    for i in range(max(len(hotel_ids), len(destination_ids))):
+        hotel_id = hotel_ids[i] if i < len(hotel_ids) else None
+        destination_id = destination_ids[i] if i < len(destination_ids) else None
+
+        if hotel_id is None:
+            key = first_in(destination_id)
+        else:
+            key = locate(hotel_id)
+            if key is not None and destination_id is not None and destination_of(key) != destination_id:
+                key = None
+        if key is not None:
+            found.append(key)
+    return found
+
+
 class HotelsService:
-    def __init__(self):
-        self.hotels = {}
+    def __init__(self, lazy=False):
+        self.hotels = MergedHotels(self._materialize)
+        # Lazy services only group merge_and_save records by id and merge a hotel when it is first read
+        self.lazy = lazy
+        self._grouped = {}
+        # Secondary indexes; hotel ids are unique, so self.hotels already serves id and (id, destination) lookups
+        self._position = {}
+        self._next_position = 0
+        self._destination = {}
+        self._by_destination = {}
+        # Records each supplier last reported, per hotel id, kept intact so merged views can be re-derived
+        self._snapshots = {}
+        self._priority = {}
+        self._merge_order = []
+        # Columnar copy handed out by columnar(), dropped whenever the catalog changes
+        self._columnar = None
 
     def merge_and_save(self, data):
+        self._columnar = None
+        if self.lazy:
+            return self._group(data)
+        merging = {}
         for hotel in data:
             if hotel.id not in self.hotels:
+                self._add(hotel)
+                continue
+            base = self.hotels[hotel.id]
+            if hotel.id not in merging:
+                merging[hotel.id] = MergeAccumulator(base)
+            self._merge(base, hotel, merging[hotel.id])
+        # Lists are rebuilt once per merged hotel rather than once per incoming duplicate
+        for hotel_id, accumulator in merging.items():
+            accumulator.freeze_into(self.hotels[hotel_id])
+
+    def _group(self, data):
+        for hotel in data:
+            records = self._grouped.get(hotel.id)
+            if records is None:
+                self._grouped[hotel.id] = [hotel]
+                self._index(hotel.id, hotel.destination_id)
+                # A hotel with a single record is its own merged view
                 self.hotels[hotel.id] = hotel
             else:
-                self._merge(self.hotels[hotel.id], hotel)
+                records.append(hotel)
+                self.hotels.invalidate(hotel.id)
 
-    def _merge(self, base: Hotel, incoming: Hotel):
-                
+    def apply_supplier_snapshot(self, supplier, hotels, priority=None):
+        """Replace everything supplier reported with hotels; only hotels whose records changed are merged again.
+
+        Records are merged in priority order (then in the order suppliers were first seen),
+        so the merged hotels do not depend on which supplier's snapshot arrives first.
+        """
+        snapshot, changed = self.diff_supplier_snapshot(supplier, hotels)
+        self.apply_snapshot_diff(supplier, snapshot, changed, priority)
+        return changed
+
+    def diff_supplier_snapshot(self, supplier, hotels):
+        """Hotels grouped by id, and the ids whose records differ from supplier's current snapshot.
+
+        Only reads the service, so callers can run this comparison outside the lock that guards queries
+        as long as nothing else applies snapshots for that supplier in the meantime.
+        """
+        snapshot = {}
+        for hotel in hotels:
+            snapshot.setdefault(hotel.id, []).append(hotel)
+        previous = self._snapshots.get(supplier, {})
+        changed = [hotel_id for hotel_id, records in snapshot.items() if previous.get(hotel_id) != records]
+        changed.extend(hotel_id for hotel_id in previous if hotel_id not in snapshot)
+        return snapshot, changed
+
+    def apply_snapshot_diff(self, supplier, snapshot, changed, priority=None):
+        """Second half of apply_supplier_snapshot: swap in a diffed snapshot and re-merge only the changed ids.
+
+        Returns the snapshot it replaced, so a caller holding a lock can let it be freed after releasing it.
+        """
+        self._columnar = None
+        if supplier not in self._priority:
+            self._priority[supplier] = (priority if priority is not None else len(self._priority), len(self._priority))
+            self._merge_order = sorted(self._priority, key=self._priority.__getitem__)
+        previous = self._snapshots.get(supplier)
+        self._snapshots[supplier] = snapshot
+        for hotel_id in changed:
+            self._invalidate(hotel_id)
+        return previous
+
+    def _records(self, hotel_id):
+        if hotel_id in self._grouped:
+            return self._grouped[hotel_id]
+        return [
+            record
+            for supplier in self._merge_order
+            for record in self._snapshots[supplier].get(hotel_id, ())
+        ]
+
+    def _invalidate(self, hotel_id):
+        records = self._records(hotel_id)
+        if not records:
+            self._remove(hotel_id)
+            return
+        # _merge never changes destination_id, so the index can be updated without merging
+        if hotel_id in self.hotels:
+            self._reindex(hotel_id, records[0].destination_id)
+        else:
+            self._index(hotel_id, records[0].destination_id)
+        self.hotels.invalidate(hotel_id)
+
+    def _materialize(self, hotel_id):
+        records = self._records(hotel_id)
+        if len(records) == 1:
+            return records[0]
+        # _merge mutates its base, and the supplier's own record must survive for later refreshes
+        hotel = self._detached(records[0])
+        accumulator = MergeAccumulator(hotel)
+        for record in records[1:]:
+            self._merge(hotel, record, accumulator)
+        accumulator.freeze_into(hotel)
+        return hotel
+
+    @staticmethod
+    def _detached(record: Hotel):
+        """Copy of record that _merge can use as its base without changing record.
+
+        _merge assigns to the location's fields and to the amenities and images attributes, so those objects
+        are new; the lists and images are shared because freeze_into replaces lists instead of editing them.
+        """
+        location = record.location
+        return Hotel(
+            id=record.id,
+            source=getattr(record, "source", None),
+            destination_id=record.destination_id,
+            name=record.name,
+            location=Location(location.lat, location.lng, location.address, location.city, location.country)
+            if location is not None else None,
+            description=record.description,
+            amenities=Amenities(general=record.amenities.general, room=record.amenities.room),
+            images=Images(rooms=record.images.rooms, site=record.images.site, amenities=record.images.amenities),
+            booking_conditions=record.booking_conditions,
+        )
+
+    def save_snapshot(self, path):
+        """Write the merged catalog to a compact binary file that MappedCatalog serves without suppliers"""
+        write_snapshot(path, self.hotels.values())
+
+    def columnar(self):
+        """Read-only ColumnarCatalog of the current hotels, rebuilt on the first call after the catalog changes"""
+        if self._columnar is None:
+            self._columnar = ColumnarCatalog(self.hotels.values())
+        return self._columnar
+
+    def _add(self, hotel: Hotel):
+        self.hotels[hotel.id] = hotel
+        self._index(hotel.id, hotel.destination_id)
+
+    def _index(self, hotel_id, destination_id):
+        self._position[hotel_id] = self._next_position
+        self._next_position += 1
+        self._destination[hotel_id] = destination_id
+        self._by_destination.setdefault(destination_id, []).append(hotel_id)
+
+    def _reindex(self, hotel_id, destination_id):
+        if self._destination[hotel_id] == destination_id:
+            return
+        self._unindex_destination(hotel_id)
+        self._destination[hotel_id] = destination_id
+        bucket = self._by_destination.setdefault(destination_id, [])
+        bisect.insort(bucket, hotel_id, key=self._position.__getitem__)
+
+    def _remove(self, hotel_id):
+        if hotel_id not in self.hotels:
+            return
+        del self.hotels[hotel_id]
+        self._unindex_destination(hotel_id)
+        del self._destination[hotel_id]
+        del self._position[hotel_id]
+
+    def _unindex_destination(self, hotel_id):
+        destination_id = self._destination[hotel_id]
+        bucket = self._by_destination[destination_id]
+        bucket.remove(hotel_id)
+        if not bucket:
+            del self._by_destination[destination_id]
+
+    def _in_catalog_order(self, hotels):
+        return sorted(hotels, key=lambda hotel: self._position[hotel.id])
+
+    def _merge(self, base: Hotel, incoming: Hotel, accumulator: MergeAccumulator):
         if base.location and incoming.location:
             for field in base.location.__dataclass_fields__:
                 base_value = getattr(base.location, field)
@@ -169,43 +941,41 @@ class HotelsService:
                 elif not base_value and incoming_value:
                     setattr(base.location, field, incoming_value)
         elif not base.location:
-            # If base location is None, copy the whole incoming location
-            base.location = incoming.location
+            # If base location is None, copy the whole incoming location; later merges edit it in place
+            location = incoming.location
+            base.location = Location(location.lat, location.lng, location.address, location.city, location.country)
 
         base.description = base.description or incoming.description
-        base.amenities.general = list(set(base.amenities.general + incoming.amenities.general))
-        base.amenities.room = list(set(base.amenities.room + incoming.amenities.room))
-        base.images.rooms = list({(image.link, image.description): image for image in base.images.rooms + incoming.images.rooms}.values())
-        base.images.site = list({(image.link, image.description): image for image in base.images.site + incoming.images.site}.values())
-        base.images.amenities.extend(incoming.images.amenities)
-        base.booking_conditions = list(set(base.booking_conditions + incoming.booking_conditions))
+        # List fields are collected here and written back once by accumulator.freeze_into
+        accumulator.add(incoming)
         if hasattr(base, "source"):
             del base.source
 
-    def find(self, hotel_ids=None, destination_ids=None): 
-        hotels_data = list(self.hotels.values()) 
-        results = [] 
-        if hotel_ids is None and destination_ids is not None: 
-            results = [hotel for hotel in hotels_data if hotel.destination_id in destination_ids] 
-            return results 
-        if destination_ids is None and hotel_ids is not None: 
-            results = [hotel for hotel in hotels_data if hotel.id in hotel_ids] 
-            return results 
-        if destination_ids is None and hotel_ids is  None: 
-            return hotels_data 
-        
-        max_length = max(len(hotel_ids), len(destination_ids))
-        for i in range(max_length): 
-            hotel_id = hotel_ids[i] if i < len(hotel_ids) else None
-            destination_id = destination_ids[i] if i < len(destination_ids) else None 
+    def find(self, hotel_ids=None, destination_ids=None):
+        if hotel_ids is None and destination_ids is not None:
+            return self._in_catalog_order(
+                self.hotels[hotel_id]
+                for destination_id in set(destination_ids)
+                for hotel_id in self._by_destination.get(destination_id, ())
+            )
+        if destination_ids is None and hotel_ids is not None:
+            return self._in_catalog_order(self.hotels[hotel_id] for hotel_id in set(hotel_ids) if hotel_id in self.hotels)
+        if destination_ids is None and hotel_ids is None:
+            return list(self.hotels.values())
 
-            for hotel in hotels_data: 
-                if (hotel_id is None or hotel.id == hotel_id) and \
-                (destination_id is None or hotel.destination_id == destination_id): 
-                    results.append(hotel) 
-                    break  
+        def first_in(destination_id):
+            candidates = self._by_destination.get(destination_id)
+            return candidates[0] if candidates else None
 
-        return results
+        return [
+            self.hotels[hotel_id]
+            for hotel_id in find_pairs(
+                hotel_ids, destination_ids,
+                lambda hotel_id: hotel_id if hotel_id in self.hotels else None,
+                first_in,
+                self._destination.__getitem__,
+            )
+        ]
 
 
     # def find(self, hotel_ids=None, destination_ids=None):
@@ -225,27 +995,741 @@ class HotelsService:
     #     return results
 
 
-def fetch_hotels(hotel_ids, destination_ids):
-    suppliers = [Acme(), Patagonia(), Paperflies()]
-    all_supplier_data = []
-    for supplier in suppliers:
-        all_supplier_data.extend(supplier.fetch())
+class MappedCatalog:
+    """Read-only catalog served straight from a memory-mapped snapshot file.
+
+    Lookups binary-search the index sections inside the mapping and decode only the hotels they return,
+    so query worker processes share one copy of the catalog through the page cache.
+    """
+
+    def __init__(self, path):
+        if sys.byteorder != "little":
+            raise RuntimeError("MappedCatalog reads snapshot sections in place and needs a little-endian host")
+        self._mmap, self._count, sections = open_snapshot(path)
+        self._id_offsets = sections["id_offsets"].cast("Q")
+        self._ids = sections["ids"]
+        self._destinations = sections["destinations"].cast("q")
+        self._record_offsets = sections["record_offsets"].cast("Q")
+        self._records = sections["records"]
+        self._id_order = sections["id_order"].cast("Q")
+        self._destination_values = sections["destination_values"].cast("q")
+        self._destination_starts = sections["destination_starts"].cast("Q")
+        self._destination_postings = sections["destination_postings"].cast("Q")
+
+    def __len__(self):
+        return self._count
+
+    def _id(self, position):
+        return bytes(self._ids[self._id_offsets[position]:self._id_offsets[position + 1] - 1])
+
+    def _hotel(self, position):
+        record = self._records[self._record_offsets[position]:self._record_offsets[position + 1]]
+        return hotel_from_dict(json.loads(bytes(record)))
+
+    def _position(self, hotel_id):
+        key = hotel_id.encode()
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._id(self._id_order[mid]) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self._count and self._id(self._id_order[lo]) == key:
+            return self._id_order[lo]
+        return None
+
+    def _destination_positions(self, destination_id):
+        if destination_id is None:
+            destination_id = SNAPSHOT_NO_DESTINATION
+        i = bisect.bisect_left(self._destination_values, destination_id)
+        if i == len(self._destination_values) or self._destination_values[i] != destination_id:
+            return ()
+        return self._destination_postings[self._destination_starts[i]:self._destination_starts[i + 1]]
+
+    def find(self, hotel_ids=None, destination_ids=None):
+        """Same lookups and result order as HotelsService.find"""
+        if hotel_ids is None and destination_ids is not None:
+            positions = {p for destination_id in set(destination_ids) for p in self._destination_positions(destination_id)}
+            return [self._hotel(position) for position in sorted(positions)]
+        if destination_ids is None and hotel_ids is not None:
+            positions = {self._position(hotel_id) for hotel_id in set(hotel_ids)}
+            positions.discard(None)
+            return [self._hotel(position) for position in sorted(positions)]
+        if destination_ids is None and hotel_ids is None:
+            return [self._hotel(position) for position in range(self._count)]
+
+        def first_in(destination_id):
+            positions = self._destination_positions(destination_id)
+            return positions[0] if len(positions) else None
+
+        def destination_of(position):
+            stored = self._destinations[position]
+            return None if stored == SNAPSHOT_NO_DESTINATION else stored
+
+        return [
+            self._hotel(position)
+            for position in find_pairs(hotel_ids, destination_ids, self._position, first_in, destination_of)
+        ]
+
+
+def column(typecode, values):
+    """NumPy array when NumPy is installed, array.array otherwise"""
+    values = array(typecode, values)
+    return np.frombuffer(values, dtype=typecode).copy() if np is not None else values
+
+
+class StringPool:
+    """Strings concatenated into one str and sliced back out by offset"""
+
+    def __init__(self, values):
+        offsets = [0]
+        for value in values:
+            offsets.append(offsets[-1] + len(value))
+        self._pool = "".join(values)
+        self._offsets = column("q", offsets)
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, position):
+        return self._pool[self._offsets[position]:self._offsets[position + 1]]
+
+    def take(self, positions):
+        return [self[position] for position in positions]
+
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(lat, lng, lats, lngs):
+    """Great-circle distances in km from (lat, lng) to each point of lats/lngs"""
+    if np is not None:
+        lat, lng = math.radians(lat), math.radians(lng)
+        lats, lngs = np.radians(lats), np.radians(lngs)
+        a = np.sin((lats - lat) / 2) ** 2 + math.cos(lat) * np.cos(lats) * np.sin((lngs - lng) / 2) ** 2
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+    distances = array("d")
+    for other_lat, other_lng in zip(lats, lngs):
+        a = (math.sin(math.radians(other_lat - lat) / 2) ** 2
+             + math.cos(math.radians(lat)) * math.cos(math.radians(other_lat)) * math.sin(math.radians(other_lng - lng) / 2) ** 2)
+        distances.append(2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0))))
+    return distances
+
+
+class GeoGrid:
+    """Spatial index over lat/lng columns: points bucketed into cell_degrees-sized cells and sorted by cell.
+
+    Cells are numbered row by row, so the cells a bounding box covers in one row of latitude are one
+    contiguous run of the sorted keys and a box query costs two binary searches per row. Points without
+    coordinates are left out.
+    """
+
+    def __init__(self, lats, lngs, cell_degrees=0.5):
+        self.cell_degrees = cell_degrees
+        self.rows = math.ceil(180 / cell_degrees)
+        self.columns = math.ceil(360 / cell_degrees)
+        if np is not None:
+            located = np.flatnonzero(~(np.isnan(lats) | np.isnan(lngs)))
+            keys = self._rows(lats[located]) * self.columns + self._columns(lngs[located])
+            order = np.argsort(keys, kind="stable")
+            self._keys, self._positions = keys[order], located[order]
+        else:
+            cells = sorted(
+                (self._row(lat) * self.columns + self._column(lng), position)
+                for position, (lat, lng) in enumerate(zip(lats, lngs))
+                if not (math.isnan(lat) or math.isnan(lng))
+            )
+            self._keys = column("q", (key for key, _ in cells))
+            self._positions = column("q", (position for _, position in cells))
+
+    def _row(self, lat):
+        return min(max(int((lat + 90) // self.cell_degrees), 0), self.rows - 1)
+
+    def _column(self, lng):
+        return min(max(int((lng + 180) // self.cell_degrees), 0), self.columns - 1)
+
+    def _rows(self, lats):
+        return np.clip(((lats + 90) // self.cell_degrees).astype(np.int64), 0, self.rows - 1)
+
+    def _columns(self, lngs):
+        return np.clip(((lngs + 180) // self.cell_degrees).astype(np.int64), 0, self.columns - 1)
+
+    def candidates(self, south, west, north, east):
+        """Positions in every cell the box touches; west > east wraps across the antimeridian"""
+        if west <= east:
+            spans = [(self._column(west), self._column(east))]
+        else:
+            spans = [(self._column(west), self.columns - 1), (0, self._column(east))]
+        runs = []
+        for row in range(self._row(south), self._row(north) + 1):
+            for first, last in spans:
+                lo, hi = row * self.columns + first, row * self.columns + last
+                if np is not None:
+                    runs.append(self._positions[np.searchsorted(self._keys, lo):np.searchsorted(self._keys, hi, "right")])
+                else:
+                    runs.append(self._positions[bisect.bisect_left(self._keys, lo):bisect.bisect_right(self._keys, hi)])
+        if np is not None:
+            return np.concatenate(runs) if runs else np.empty(0, dtype=np.int64)
+        return [position for run in runs for position in run]
+
+
+class ColumnarCatalog:
+    """Read-only catalog stored as one column per scanned field instead of one object per hotel.
+
+    destination_ids, lats and lngs are flat numeric arrays (NumPy when installed), ids and names live in
+    string pools, and every other field stays in a compact JSON record that is decoded only for the hotels
+    a query returns. Missing destinations use SNAPSHOT_NO_DESTINATION and missing coordinates are NaN.
+    """
+
+    def __init__(self, hotels):
+        ids, names, destinations, lats, lngs = [], [], [], [], []
+        records = bytearray()
+        record_offsets = [0]
+        # First position per destination, for paired lookups that fall back to a destination
+        self._first = {}
+        for hotel in hotels:
+            self._first.setdefault(hotel.destination_id, len(ids))
+            ids.append(hotel.id)
+            names.append(hotel.name or "")
+            destinations.append(SNAPSHOT_NO_DESTINATION if hotel.destination_id is None else hotel.destination_id)
+            location = hotel.location
+            lats.append(float("nan") if location is None or location.lat is None else location.lat)
+            lngs.append(float("nan") if location is None or location.lng is None else location.lng)
+            records += json.dumps(hotel_to_dict(hotel), separators=(",", ":")).encode()
+            record_offsets.append(len(records))
+
+        self.ids = StringPool(ids)
+        self.names = StringPool(names)
+        self.destination_ids = column("q", destinations)
+        self.lats = column("d", lats)
+        self.lngs = column("d", lngs)
+        self._records = bytes(records)
+        self._record_offsets = column("q", record_offsets)
+        self._positions = dict(zip(ids, range(len(ids))))
+        self.grid = GeoGrid(self.lats, self.lngs)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def hotel(self, position):
+        """Hotel view of one row"""
+        return hotel_from_dict(json.loads(self._records[self._record_offsets[position]:self._record_offsets[position + 1]]))
+
+    def hotels(self, positions):
+        return [self.hotel(position) for position in positions]
+
+    def _destination(self, position):
+        destination_id = int(self.destination_ids[position])
+        return None if destination_id == SNAPSHOT_NO_DESTINATION else destination_id
+
+    def positions_in(self, destination_ids):
+        """Catalog positions of every hotel in any of destination_ids, in catalog order"""
+        wanted = {SNAPSHOT_NO_DESTINATION if destination_id is None else destination_id for destination_id in destination_ids}
+        if np is not None:
+            return np.flatnonzero(np.isin(self.destination_ids, list(wanted)))
+        return [position for position, destination_id in enumerate(self.destination_ids) if destination_id in wanted]
+
+    def export(self, positions=None):
+        """Scan columns for the given positions (all hotels by default) as id, name, destination_id, lat, lng"""
+        if positions is None:
+            positions = range(len(self))
+        if np is not None:
+            positions = np.asarray(positions, dtype=np.intp)
+            numeric = {name: getattr(self, name)[positions] for name in ("destination_ids", "lats", "lngs")}
+        else:
+            numeric = {name: array(getattr(self, name).typecode, map(getattr(self, name).__getitem__, positions))
+                       for name in ("destination_ids", "lats", "lngs")}
+        return {
+            "id": self.ids.take(positions),
+            "name": self.names.take(positions),
+            "destination_id": numeric["destination_ids"],
+            "lat": numeric["lats"],
+            "lng": numeric["lngs"],
+        }
+
+    def positions_within(self, south, west, north, east):
+        """Catalog positions of hotels inside the box, in catalog order; west > east wraps across the antimeridian"""
+        if not all(map(math.isfinite, (south, west, north, east))):
+            raise ValueError("bounding box edges must be finite")
+        positions = self.grid.candidates(south, west, north, east)
+        if np is not None:
+            lats, lngs = self.lats[positions], self.lngs[positions]
+            inside = (lats >= south) & (lats <= north)
+            inside &= (lngs >= west) & (lngs <= east) if west <= east else (lngs >= west) | (lngs <= east)
+            return np.sort(positions[inside])
+        return sorted(
+            position for position in positions
+            if south <= self.lats[position] <= north
+            and ((west <= self.lngs[position] <= east) if west <= east else not (east < self.lngs[position] < west))
+        )
+
+    def positions_near(self, lat, lng, radius_km):
+        """Positions of hotels within radius_km of (lat, lng) and their distances, nearest first"""
+        if not all(map(math.isfinite, (lat, lng, radius_km))) or radius_km < 0:
+            raise ValueError("lat, lng and radius_km must be finite and radius_km not negative")
+        angle = radius_km / EARTH_RADIUS_KM
+        south, north = lat - math.degrees(angle), lat + math.degrees(angle)
+        west, east = -180.0, 180.0
+        # Widen the longitude span by the latitude's parallel shrinking, unless the circle reaches a pole
+        if south > -90 and north < 90:
+            spread = math.sin(angle) / math.cos(math.radians(lat))
+            if spread < 1:
+                offset = math.degrees(math.asin(spread))
+                west, east = lng - offset, lng + offset
+                if west < -180:
+                    west += 360
+                if east > 180:
+                    east -= 360
+        positions = self.grid.candidates(max(south, -90), west, min(north, 90), east)
+        if np is not None:
+            distances = haversine_km(lat, lng, self.lats[positions], self.lngs[positions])
+            near = distances <= radius_km
+            positions, distances = positions[near], distances[near]
+            order = np.lexsort((positions, distances))
+            return positions[order], distances[order]
+        distances = haversine_km(lat, lng, [self.lats[p] for p in positions], [self.lngs[p] for p in positions])
+        near = sorted((distance, position) for position, distance in zip(positions, distances) if distance <= radius_km)
+        return [position for _, position in near], [distance for distance, _ in near]
+
+    def find_within(self, south, west, north, east):
+        """Hotels whose location lies inside the bounding box, in catalog order"""
+        return self.hotels(self.positions_within(south, west, north, east))
+
+    def find_near(self, lat, lng, radius_km):
+        """Hotels within radius_km of (lat, lng), nearest first"""
+        return self.hotels(self.positions_near(lat, lng, radius_km)[0])
+
+    def find(self, hotel_ids=None, destination_ids=None):
+        """Same lookups and result order as HotelsService.find"""
+        if hotel_ids is None and destination_ids is not None:
+            return self.hotels(self.positions_in(destination_ids))
+        if destination_ids is None and hotel_ids is not None:
+            positions = {self._positions.get(hotel_id) for hotel_id in set(hotel_ids)}
+            positions.discard(None)
+            return self.hotels(sorted(positions))
+        if destination_ids is None and hotel_ids is None:
+            return self.hotels(range(len(self)))
+
+        return self.hotels(
+            find_pairs(hotel_ids, destination_ids, self._positions.get, self._first.get, self._destination)
+        )
+
+
+def fetch_suppliers(suppliers, concurrent=True, stream=False, query=None):
+    """Yield each supplier's hotels in supplier order, fetching all suppliers at once if concurrent"""
+    if stream:
+        # Streams are merged while they download, so suppliers are read one after another
+        for supplier in suppliers:
+            yield supplier.iter_fetch(query)
+        return
+    if not concurrent:
+        for supplier in suppliers:
+            yield supplier.fetch(query)
+        return
+
+    with ThreadPoolExecutor(max_workers=len(suppliers)) as pool:
+        futures = {pool.submit(supplier.fetch, query): i for i, supplier in enumerate(suppliers)}
+        arrived = {}
+        next_index = 0
+        for future in as_completed(futures):
+            arrived[futures[future]] = future.result()
+            # Merge order decides which supplier wins a field, so only release results in supplier order
+            while next_index in arrived:
+                yield arrived.pop(next_index)
+                next_index += 1
+
+
+def fetch_snapshots(suppliers, concurrent=True, stream=False):
+    """Each supplier's name, the full list of hotels it currently reports and its merge priority"""
+    return [
+        (type(supplier).__name__, list(hotels), supplier.priority)
+        for supplier, hotels in zip(suppliers, fetch_suppliers(suppliers, concurrent, stream))
+    ]
+
 
-    svc = HotelsService()
-    svc.merge_and_save(all_supplier_data)
+def build_service(suppliers, concurrent=True, stream=False, lazy=False, query=None):
+    svc = HotelsService(lazy)
+    for supplier_data in fetch_suppliers(suppliers, concurrent, stream, query):
+        svc.merge_and_save(supplier_data)
+    return svc
 
+
+def parse_query(hotel_ids, destination_ids):
     hotel_ids = hotel_ids.split(",") if hotel_ids != "none" else None
     destination_ids = list(map(int, destination_ids.split(","))) if destination_ids != "none" else None
-    filtered_hotels = svc.find(hotel_ids, destination_ids)
-    return json.dumps([hotel.__dict__ for hotel in filtered_hotels], default=lambda o: o.__dict__)
+    return hotel_ids, destination_ids
+
+
+def location_to_dict(location: Location):
+    return {
+        "lat": location.lat,
+        "lng": location.lng,
+        "address": location.address,
+        "city": location.city,
+        "country": location.country,
+    }
+
+
+def image_to_dict(image: Image):
+    return {"link": image.link, "description": image.description}
+
+
+def hotel_to_dict(hotel: Hotel):
+    data = {"id": hotel.id}
+    # Merged hotels drop their source, unmerged ones still report it
+    if hasattr(hotel, "source"):
+        data["source"] = hotel.source
+    data["destination_id"] = hotel.destination_id
+    data["name"] = hotel.name
+    data["location"] = location_to_dict(hotel.location) if hotel.location is not None else None
+    data["description"] = hotel.description
+    data["amenities"] = {"general": hotel.amenities.general, "room": hotel.amenities.room}
+    data["images"] = {
+        "rooms": [image_to_dict(image) for image in hotel.images.rooms],
+        "site": [image_to_dict(image) for image in hotel.images.site],
+        "amenities": [image_to_dict(image) for image in hotel.images.amenities],
+    }
+    data["booking_conditions"] = hotel.booking_conditions
+    return data
+
+
+def hotel_from_dict(data):
+    """Inverse of hotel_to_dict"""
+    location = data["location"]
+    images = data["images"]
+    hotel = Hotel(
+        id=data["id"],
+        source=data.get("source"),
+        destination_id=data["destination_id"],
+        name=data["name"],
+        location=Location(**location) if location is not None else None,
+        description=data["description"],
+        amenities=Amenities(general=data["amenities"]["general"], room=data["amenities"]["room"]),
+        images=Images(
+            rooms=[Image(**image) for image in images["rooms"]],
+            site=[Image(**image) for image in images["site"]],
+            amenities=[Image(**image) for image in images["amenities"]],
+        ),
+        booking_conditions=data["booking_conditions"],
+    )
+    if "source" not in data:
+        del hotel.source
+    return hotel
+
+
+def dump_hotels(hotels):
+    return json.dumps([hotel_to_dict(hotel) for hotel in hotels])
+
+
+def write_hotels(hotels, out, ndjson=False):
+    """Write hotels one at a time, as a JSON array or as one JSON object per line"""
+    if ndjson:
+        for hotel in hotels:
+            out.write(json.dumps(hotel_to_dict(hotel)))
+            out.write("\n")
+        return
+    out.write("[")
+    for i, hotel in enumerate(hotels):
+        if i:
+            out.write(", ")
+        out.write(json.dumps(hotel_to_dict(hotel)))
+    out.write("]\n")
+
+
+def default_suppliers(session=None, cache=None):
+    session = session or default_session()
+    return [supplier(session, cache) for supplier in (Acme, Patagonia, Paperflies)]
+
+
+def query_hotels(
+    hotel_ids,
+    destination_ids,
+    concurrent=True,
+    session=None,
+    cache=None,
+    stream=False,
+    lazy=False,
+    pushdown=True,
+    save_snapshot=None,
+):
+    hotel_ids, destination_ids = parse_query(hotel_ids, destination_ids)
+    # A saved snapshot has to hold the whole catalog, not just this query's hotels
+    query = HotelQuery.for_find(hotel_ids, destination_ids) if pushdown and not save_snapshot else None
+    suppliers = default_suppliers(session, cache)
+    svc = build_service(suppliers, concurrent, stream, lazy, query)
+    if save_snapshot:
+        svc.save_snapshot(save_snapshot)
+    return svc.find(hotel_ids, destination_ids)
+
+
+def fetch_hotels(hotel_ids, destination_ids, **options):
+    return dump_hotels(query_hotels(hotel_ids, destination_ids, **options))
+
+
+class AsyncBaseSupplier:
+    """Awaitable fetch for a supplier; the blocking request runs on a worker thread, off the event loop.
+
+    Threads can't be interrupted, so cancellation or a missed deadline only stops the awaiting task.
+    The worker thread keeps its slot in the default executor until its request returns or times out.
+    A deadline shorter than the supplier's timeout is therefore also used as the request timeout;
+    requests applies that to each connect and read, not to the download as a whole.
+    """
+
+    def __init__(self, supplier: BaseSupplier, deadline=None):
+        self.supplier = supplier
+        self.deadline = deadline
+
+    async def fetch(self, query: HotelQuery = None):
+        supplier = self.supplier
+        if self.deadline is not None and self.deadline < supplier.timeout:
+            supplier = copy.copy(supplier)
+            supplier.timeout = self.deadline
+        return await asyncio.wait_for(asyncio.to_thread(supplier.fetch, query), self.deadline)
+
+
+async def fetch_hotels_async(
+    hotel_ids, destination_ids, suppliers=None, max_concurrency=None, deadline=None, pushdown=True
+):
+    """fetch_hotels without blocking the event loop; deadline bounds each supplier's fetch, including given ones"""
+    hotel_ids, destination_ids = parse_query(hotel_ids, destination_ids)
+    query = HotelQuery.for_find(hotel_ids, destination_ids) if pushdown else None
+    if suppliers is None:
+        suppliers = [AsyncBaseSupplier(supplier, deadline) for supplier in default_suppliers()]
+    semaphore = asyncio.Semaphore(max_concurrency or len(suppliers))
+
+    async def fetch(supplier):
+        async with semaphore:
+            return await asyncio.wait_for(supplier.fetch(query), deadline)
+
+    tasks = [asyncio.create_task(fetch(supplier)) for supplier in suppliers]
+    try:
+        results = await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+    def merge_and_dump():
+        svc = HotelsService()
+        for supplier_data in results:
+            svc.merge_and_save(supplier_data)
+        return dump_hotels(svc.find(hotel_ids, destination_ids))
+
+    # Merging a large catalog is CPU work, so it stays off the event loop too
+    return await asyncio.to_thread(merge_and_dump)
+
+
+class HotelsRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    geo_routes = {
+        "/hotels/near": ("find_near", ("lat", "lng", "radius_km")),
+        "/hotels/within": ("find_within", ("south", "west", "north", "east")),
+    }
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path in self.geo_routes:
+            return self._geo(url)
+        if url.path != "/hotels":
+            return self._reply(404, json.dumps({"error": "not found"}))
+        # Blank values are kept so that "hotel_ids=" finds nothing, as an empty CLI argument does
+        query = parse_qs(url.query, keep_blank_values=True)
+        try:
+            hotel_ids, destination_ids = parse_query(
+                query.get("hotel_ids", ["none"])[0],
+                query.get("destination_ids", ["none"])[0],
+            )
+        except ValueError:
+            return self._reply(400, json.dumps({"error": "destination_ids must be integers"}))
+        self._reply(200, dump_hotels(self.server.find(hotel_ids, destination_ids)))
+
+    def _geo(self, url):
+        method, params = self.geo_routes[url.path]
+        find = getattr(getattr(self.server, "catalog", None), method, None)
+        if find is None:
+            return self._reply(404, json.dumps({"error": "geo search needs serve --catalog FILE --columnar"}))
+        query = parse_qs(url.query)
+        try:
+            args = [float(query[param][0]) for param in params]
+        except (KeyError, ValueError):
+            args = None
+        # float() also accepts nan and inf, which no grid cell or distance can be computed for
+        if args is None or not all(map(math.isfinite, args)) or (method == "find_near" and args[2] < 0):
+            return self._reply(400, json.dumps({"error": f"{', '.join(params)} must be finite numbers"}))
+        self._reply(200, dump_hotels(find(*args)))
+
+    def _reply(self, status, body):
+        body = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class HotelsServer(ThreadingHTTPServer):
+    """Serves find() queries from a warm HotelsService that is refreshed in the background"""
+    daemon_threads = True
+
+    def __init__(self, address, load_snapshots, refresh_interval=300):
+        super().__init__(address, HotelsRequestHandler)
+        self.load_snapshots = load_snapshots
+        self.refresh_interval = refresh_interval
+        self.service = HotelsService()
+        self.lock = threading.Lock()
+        self._refreshing = threading.Lock()
+        self.refresh()
+        self._stopped = threading.Event()
+        self._refresher = threading.Thread(target=self._refresh_forever, daemon=True)
+
+    def refresh(self):
+        # Download and diff outside the query lock, which is then held only to swap in what changed.
+        # Refreshes are serialized, so the snapshots being diffed against can't move underneath.
+        with self._refreshing:
+            diffs = [
+                (supplier, *self.service.diff_supplier_snapshot(supplier, hotels), priority)
+                for supplier, hotels, priority in self.load_snapshots()
+            ]
+            with self.lock:
+                replaced = [self.service.apply_snapshot_diff(*diff) for diff in diffs]
+            del replaced
+
+    def find(self, hotel_ids, destination_ids):
+        with self.lock:
+            return self.service.find(hotel_ids, destination_ids)
+
+    def _refresh_forever(self):
+        while not self._stopped.wait(self.refresh_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Supplier refresh failed, keeping previous catalog: {e}", file=sys.stderr)
+
+    def serve_forever(self, poll_interval=0.5):
+        self._refresher.start()
+        try:
+            super().serve_forever(poll_interval)
+        finally:
+            self._stopped.set()
+
+
+class CatalogServer(ThreadingHTTPServer):
+    """Serves find() queries from a read-only MappedCatalog or ColumnarCatalog; run one per worker process"""
+    daemon_threads = True
+    allow_reuse_port = True
+
+    def __init__(self, address, catalog):
+        super().__init__(address, HotelsRequestHandler)
+        self.catalog = catalog
+
+    def find(self, hotel_ids, destination_ids):
+        return self.catalog.find(hotel_ids, destination_ids)
+
+
+def add_fetch_arguments(parser):
+    parser.add_argument("--sequential", action="store_true", help="Fetch suppliers one after another")
+    parser.add_argument("--pool-size", type=int, default=10, help="Connections kept alive per supplier host")
+    parser.add_argument("--retries", type=int, default=3, help="Retries for failed supplier requests")
+    parser.add_argument("--backoff", type=float, default=0.5, help="Backoff factor between retries, in seconds")
+    parser.add_argument("--cache-dir", default=".supplier_cache", help="Directory for cached supplier responses")
+    parser.add_argument("--no-cache", action="store_true", help="Always download supplier responses")
+    parser.add_argument(
+        "--stream", action="store_true",
+        help="Parse and merge supplier responses while they download; cached responses are streamed from disk",
+    )
+
+
+def add_query_arguments(parser):
+    """Options that only shape a one-off query; the server always keeps a fully merged catalog"""
+    parser.add_argument("--lazy", action="store_true", help="Only merge the hotels a query returns")
+    parser.add_argument("--no-pushdown", action="store_true", help="Fetch and parse every hotel even for targeted queries")
+
+
+def fetch_options(args):
+    session = make_session(args.pool_size, args.retries, args.backoff)
+    cache = None if args.no_cache else SupplierCache(args.cache_dir)
+    return {
+        "concurrent": not args.sequential,
+        "session": session,
+        "cache": cache,
+        "stream": args.stream,
+    }
+
+
+def query_options(args):
+    return {
+        "lazy": args.lazy,
+        "pushdown": not args.no_pushdown,
+    }
+
+
+def serve(argv):
+    parser = argparse.ArgumentParser(prog="main.py serve")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=8000, help="Port to listen on")
+    parser.add_argument("--refresh-interval", type=float, default=300, help="Seconds between supplier refreshes")
+    parser.add_argument("--catalog", help="Serve this snapshot file read-only instead of fetching suppliers")
+    parser.add_argument(
+        "--columnar", action="store_true",
+        help="Load --catalog into a ColumnarCatalog, enabling /hotels/near and /hotels/within",
+    )
+    add_fetch_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.catalog:
+        catalog = MappedCatalog(args.catalog)
+        if args.columnar:
+            catalog = ColumnarCatalog(catalog.find())
+        return serve_forever(CatalogServer((args.host, args.port), catalog), args.host)
+    options = fetch_options(args)
+    suppliers = default_suppliers(options["session"], options["cache"])
+    server = HotelsServer(
+        (args.host, args.port),
+        lambda: fetch_snapshots(suppliers, options["concurrent"], options["stream"]),
+        args.refresh_interval,
+    )
+    serve_forever(server, args.host)
+
+
+def serve_forever(server, host):
+    print(f"Serving hotels on http://{host}:{server.server_port}/hotels", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
 
 
 def main():
+    if sys.argv[1:2] == ["serve"]:
+        return serve(sys.argv[2:])
     parser = argparse.ArgumentParser()
     parser.add_argument("hotel_ids", type=str, help="Hotel IDs")
     parser.add_argument("destination_ids", type=str, help="Destination IDs")
+    add_fetch_arguments(parser)
+    add_query_arguments(parser)
+    parser.add_argument("--output", help="Write hotels to this file instead of stdout")
+    parser.add_argument("--ndjson", action="store_true", help="Write one hotel per line instead of a JSON array")
+    parser.add_argument("--save-snapshot", help="Also save the merged catalog to this binary snapshot file")
+    parser.add_argument("--load-snapshot", help="Answer from this binary snapshot instead of calling suppliers")
     args = parser.parse_args()
-    print(fetch_hotels(args.hotel_ids, args.destination_ids))
+    if args.load_snapshot:
+        hotels = MappedCatalog(args.load_snapshot).find(*parse_query(args.hotel_ids, args.destination_ids))
+    else:
+        hotels = query_hotels(
+            args.hotel_ids, args.destination_ids, save_snapshot=args.save_snapshot,
+            **fetch_options(args), **query_options(args),
+        )
+    if args.output:
+        with open(args.output, "w") as out:
+            write_hotels(hotels, out, args.ndjson)
+    else:
+        write_hotels(hotels, sys.stdout, args.ndjson)
 
 
 if __name__ == "__main__":
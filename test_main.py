@@ -0,0 +1,612 @@
+import asyncio
+import gzip
+import io
+import itertools
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+import main
+from bench import generate_payloads, start_stand_in, stand_in_suppliers
+
+
+@pytest.fixture(scope="module")
+def payloads():
+    return generate_payloads(300, overlap=0.5, destinations=12, seed=7)
+
+
+@pytest.fixture(scope="module")
+def stand_in(payloads):
+    server = start_stand_in(payloads)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(scope="module")
+def service(stand_in):
+    svc = main.build_service(stand_in_suppliers(stand_in))
+    svc.merge_and_save([main.Hotel(id="no-destination", source="Acme", destination_id=None, name="Nowhere")])
+    return svc
+
+
+def random_queries(svc, count=200, seed=0):
+    rng = random.Random(seed)
+    ids = list(svc.hotels)
+    destinations = sorted({hotel.destination_id for hotel in svc.hotels.values()}, key=str)
+    queries = [(None, None), ([], []), (["missing"], None), (None, [None]), (None, [-1])]
+    for _ in range(count):
+        hotel_ids = rng.choice([None, rng.sample(ids, rng.randrange(4)) + rng.choice([[], ["missing"]])])
+        destination_ids = rng.choice([None, [rng.choice(destinations) for _ in range(rng.randrange(5))]])
+        queries.append((hotel_ids, destination_ids))
+    return queries
+
+
+def test_merged_lists_keep_supplier_order_without_duplicates():
+    def record(source, general, room, amenity_images, conditions):
+        return main.Hotel(
+            id="h", source=source, destination_id=1, name=source,
+            amenities=main.Amenities(general=general, room=room),
+            images=main.Images(
+                rooms=[main.Image("r.jpg", "Room")],
+                amenities=[main.Image(link, "Amenity") for link in amenity_images],
+            ),
+            booking_conditions=conditions,
+        )
+
+    svc = main.HotelsService()
+    svc.merge_and_save([
+        record("Acme", ["pool", "wifi"], [], ["b.jpg", "a.jpg"], ["no pets"]),
+        record("Patagonia", ["wifi", "bar", "pool"], ["tv"], ["a.jpg", "c.jpg", "b.jpg"], ["late checkout", "no pets"]),
+        record("Paperflies", ["gym", "bar"], ["tv", "kettle"], ["c.jpg", "d.jpg"], []),
+    ])
+    hotel = svc.hotels["h"]
+    assert hotel.amenities.general == ["pool", "wifi", "bar", "gym"]
+    assert hotel.amenities.room == ["tv", "kettle"]
+    assert [image.link for image in hotel.images.amenities] == ["b.jpg", "a.jpg", "c.jpg", "d.jpg"]
+    assert [image.link for image in hotel.images.rooms] == ["r.jpg"]
+    assert hotel.booking_conditions == ["no pets", "late checkout"]
+    assert hotel.name == "Acme"
+
+
+def test_concurrent_fetch_merges_in_supplier_order(stand_in):
+    suppliers = stand_in_suppliers(stand_in)
+    first = suppliers[0]
+    fetch = first.fetch
+
+    def slow_fetch(query=None):
+        # The first supplier answers last, so results arrive out of supplier order
+        time.sleep(0.3)
+        return fetch(query)
+
+    first.fetch = slow_fetch
+    sequential = main.build_service(stand_in_suppliers(stand_in), concurrent=False).find()
+    concurrent = main.build_service(suppliers, concurrent=True).find()
+    assert main.dump_hotels(concurrent) == main.dump_hotels(sequential)
+
+
+@pytest.mark.parametrize("count", [0, 1, 3])
+def test_write_hotels_matches_dump_hotels(service, count):
+    hotels = service.find()[:count]
+    expected = [main.hotel_to_dict(hotel) for hotel in hotels]
+
+    out = io.StringIO()
+    main.write_hotels(hotels, out)
+    assert out.getvalue().endswith("]\n")
+    assert json.loads(out.getvalue()) == json.loads(main.dump_hotels(hotels)) == expected
+
+    out = io.StringIO()
+    main.write_hotels(hotels, out, ndjson=True)
+    assert [json.loads(line) for line in out.getvalue().splitlines()] == expected
+    assert out.getvalue().count("\n") == count
+
+
+def test_vocabulary_shares_one_object_per_term():
+    vocabulary = main.Vocabulary(limit=2)
+    pool = vocabulary("".join(["po", "ol"]))
+    assert vocabulary("".join(["po", "ol"])) is pool
+    assert vocabulary(None) is None
+    vocabulary("wifi")
+    # A full table starts over instead of growing
+    vocabulary("spa")
+    assert len(vocabulary) == 1
+    assert vocabulary("".join(["po", "ol"])) is not pool
+
+
+def test_parsed_hotels_share_interned_strings(stand_in):
+    hotels = [hotel for supplier in stand_in_suppliers(stand_in) for hotel in supplier.fetch()]
+    terms = {}
+    for hotel in hotels:
+        strings = [hotel.location.city, hotel.location.country] if hotel.location else []
+        strings += hotel.amenities.general + hotel.amenities.room + hotel.booking_conditions
+        strings += [image.description for image in hotel.images.rooms + hotel.images.site + hotel.images.amenities]
+        for value in filter(None, strings):
+            assert terms.setdefault(value, value) is value
+    assert terms
+
+
+def test_iter_json_array_at_every_chunk_boundary():
+    values = [
+        {"id": "a", "n": -12, "x": 1.5e-3, "ok": True, "none": None},
+        "café ☃ \\\"quoted\\\"",
+        [],
+        {},
+        12345,
+        -0.25,
+        [1, [2, [3]]],
+    ]
+    data = json.dumps(values, ensure_ascii=False).encode()
+    for cut in range(len(data) + 1):
+        assert list(main.iter_json_array([data[:cut], data[cut:]])) == values
+    assert list(main.iter_json_array(data[i:i + 1] for i in range(len(data)))) == values
+    assert list(main.iter_json_array([b" [ ] "])) == []
+
+
+def test_iter_json_array_rejects_malformed_payloads():
+    with pytest.raises(ValueError):
+        list(main.iter_json_array([b'{"a": 1}']))
+    with pytest.raises(ValueError):
+        list(main.iter_json_array([b"[1, 2"]))
+    with pytest.raises(ValueError):
+        list(main.iter_json_array([b"[1 2]"]))
+
+
+def test_http_errors_raise_on_every_fetch_path(stand_in, tmp_path):
+    class Missing(main.Acme):
+        endpoint = staticmethod(lambda: f"http://127.0.0.1:{stand_in.server_port}/suppliers/missing")
+
+    for supplier in [Missing(), Missing(cache=main.SupplierCache(str(tmp_path)))]:
+        with pytest.raises(requests.HTTPError):
+            supplier.fetch()
+        with pytest.raises(requests.HTTPError):
+            list(supplier.iter_fetch())
+
+
+@pytest.fixture
+def hotels_server(stand_in):
+    suppliers = stand_in_suppliers(stand_in)
+    server = main.HotelsServer(("127.0.0.1", 0), lambda: main.fetch_snapshots(suppliers))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_refresh_diffs_outside_the_query_lock(stand_in):
+    suppliers = stand_in_suppliers(stand_in)
+    server = main.HotelsServer(("127.0.0.1", 0), lambda: main.fetch_snapshots(suppliers))
+    diffing, release = threading.Event(), threading.Event()
+    diff = server.service.diff_supplier_snapshot
+
+    def slow_diff(*args):
+        diffing.set()
+        release.wait(5)
+        return diff(*args)
+
+    server.service.diff_supplier_snapshot = slow_diff
+    refresher = threading.Thread(target=server.refresh)
+    refresher.start()
+    try:
+        assert diffing.wait(5)
+        assert server.lock.acquire(timeout=1)
+        server.lock.release()
+    finally:
+        release.set()
+        refresher.join()
+        server.server_close()
+
+
+@pytest.mark.parametrize("option", ["--lazy", "--no-pushdown"])
+def test_serve_rejects_query_only_options(option, capsys):
+    with pytest.raises(SystemExit):
+        main.serve([option])
+    assert "unrecognized arguments" in capsys.readouterr().err
+
+
+def linear_find(hotels, hotel_ids=None, destination_ids=None):
+    """HotelsService.find as it was before the indexes: a scan of every hotel per lookup.
+
+    The one difference is that a paired None destination means "no destination", as it does for
+    destination-only lookups, rather than "any hotel"; parse_query never produces one.
+    """
+    if hotel_ids is None and destination_ids is not None:
+        return [hotel for hotel in hotels if hotel.destination_id in destination_ids]
+    if destination_ids is None and hotel_ids is not None:
+        return [hotel for hotel in hotels if hotel.id in hotel_ids]
+    if destination_ids is None and hotel_ids is None:
+        return list(hotels)
+    results = []
+    for i in range(max(len(hotel_ids), len(destination_ids))):
+        hotel_id = hotel_ids[i] if i < len(hotel_ids) else None
+        destination_id = destination_ids[i] if i < len(destination_ids) else None
+        for hotel in hotels:
+            if hotel_id is None and hotel.destination_id == destination_id:
+                results.append(hotel)
+                break
+            if hotel.id == hotel_id and (destination_id is None or hotel.destination_id == destination_id):
+                results.append(hotel)
+                break
+    return results
+
+
+def test_indexed_find_matches_linear_scan(service):
+    hotels = list(service.hotels.values())
+    for hotel_ids, destination_ids in random_queries(service):
+        expected = linear_find(hotels, hotel_ids, destination_ids)
+        assert [hotel.id for hotel in service.find(hotel_ids, destination_ids)] == [hotel.id for hotel in expected]
+
+
+def test_server_answers_like_find(hotels_server, stand_in):
+    svc = main.build_service(stand_in_suppliers(stand_in))
+    ids = list(svc.hotels)
+    destination = svc.hotels[ids[0]].destination_id
+    cases = [
+        ("none", "none"),
+        (f"{ids[0]},{ids[1]},missing", "none"),
+        ("none", str(destination)),
+        (f"{ids[0]},{ids[2]}", f"{destination},{destination}"),
+    ]
+    for hotel_ids, destination_ids in cases:
+        resp = requests.get(f"{hotels_server}/hotels", params={"hotel_ids": hotel_ids, "destination_ids": destination_ids})
+        assert resp.status_code == 200
+        assert resp.json() == json.loads(main.dump_hotels(svc.find(*main.parse_query(hotel_ids, destination_ids))))
+
+
+def test_server_rejects_bad_queries(hotels_server):
+    resp = requests.get(f"{hotels_server}/hotels?destination_ids=abc")
+    assert resp.status_code == 400
+    assert resp.json() == {"error": "destination_ids must be integers"}
+    assert requests.get(f"{hotels_server}/hotels?destination_ids=").status_code == 400
+    assert requests.get(f"{hotels_server}/nope").status_code == 404
+    assert requests.get(f"{hotels_server}/hotels/near?lat=1&lng=2&radius_km=3").status_code == 404
+
+
+def test_server_blank_hotel_ids_match_nothing(hotels_server):
+    assert requests.get(f"{hotels_server}/hotels?hotel_ids=").json() == []
+    assert len(requests.get(f"{hotels_server}/hotels").json()) == 300
+
+
+def test_snapshot_catalogs_find_like_service(service, tmp_path):
+    path = str(tmp_path / "catalog.snap")
+    service.save_snapshot(path)
+    mapped = main.MappedCatalog(path)
+    columnar = service.columnar()
+    assert len(mapped) == len(columnar) == len(service.hotels)
+    for hotel_ids, destination_ids in random_queries(service):
+        expected = main.dump_hotels(service.find(hotel_ids, destination_ids))
+        assert main.dump_hotels(mapped.find(hotel_ids, destination_ids)) == expected
+        assert main.dump_hotels(columnar.find(hotel_ids, destination_ids)) == expected
+
+
+def test_columnar_geo_search_matches_brute_force(service):
+    columnar = service.columnar()
+    located = [
+        (position, hotel) for position, hotel in enumerate(service.hotels.values())
+        if hotel.location is not None and hotel.location.lat is not None
+    ]
+    rng = random.Random(1)
+    for _ in range(50):
+        lat, lng, radius = rng.uniform(-90, 90), rng.uniform(-180, 180), rng.choice([100, 2000, 8000])
+        distances = main.haversine_km(
+            lat, lng, [hotel.location.lat for _, hotel in located], [hotel.location.lng for _, hotel in located]
+        )
+        expected = [position for distance, position in sorted(zip(distances, (p for p, _ in located))) if distance <= radius]
+        assert [int(position) for position in columnar.positions_near(lat, lng, radius)[0]] == expected
+
+        south, north = sorted(rng.uniform(-70, 70) for _ in range(2))
+        west, east = rng.uniform(-180, 180), rng.uniform(-180, 180)
+        inside = [
+            position for position, hotel in located
+            if south <= hotel.location.lat <= north
+            and (west <= hotel.location.lng <= east if west <= east else not east < hotel.location.lng < west)
+        ]
+        assert [int(position) for position in columnar.positions_within(south, west, north, east)] == inside
+
+
+def test_geo_routes_reject_non_finite_and_negative_values(service):
+    server = main.CatalogServer(("127.0.0.1", 0), service.columnar())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    try:
+        assert requests.get(f"{base}/hotels/near?lat=10&lng=20&radius_km=5000").status_code == 200
+        assert requests.get(f"{base}/hotels/within?south=-10&west=170&north=10&east=-170").status_code == 200
+        for query in [
+            "near?lat=nan&lng=0&radius_km=1",
+            "near?lat=0&lng=inf&radius_km=1",
+            "near?lat=0&lng=0&radius_km=-1",
+            "near?lat=0&lng=0",
+            "within?south=0&west=0&north=inf&east=1",
+            "within?south=nan&west=0&north=1&east=1",
+        ]:
+            resp = requests.get(f"{base}/hotels/{query}")
+            assert resp.status_code == 400, query
+    finally:
+        server.shutdown()
+        server.server_close()
+    with pytest.raises(ValueError):
+        service.columnar().find_near(float("nan"), 0, 1)
+
+
+def test_columnar_is_rebuilt_after_changes(service):
+    svc = main.HotelsService()
+    svc.merge_and_save(list(service.hotels.values())[:10])
+    columnar = svc.columnar()
+    assert svc.columnar() is columnar
+    svc.merge_and_save([main.Hotel(id="new", source="Acme", destination_id=1, name="New")])
+    assert len(svc.columnar()) == 11
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_pushdown_finds_what_a_full_fetch_finds(stand_in, stream):
+    full = main.build_service(stand_in_suppliers(stand_in))
+    hotel = full.find()[0]
+    others = sorted({h.destination_id for h in full.find()} - {hotel.destination_id})
+    # Paired lookups fall back to the first hotel of a destination once the hotel ids run out
+    paired = [
+        ([hotel.id], [hotel.destination_id, others[0]]),
+        ([hotel.id], [others[0], others[1], others[2]]),
+        ([hotel.id, "missing"], [others[0], hotel.destination_id, others[1]]),
+        ([], [others[0], -1]),
+    ]
+    for hotel_ids, destination_ids in paired + random_queries(full, count=40):
+        query = main.HotelQuery.for_find(hotel_ids, destination_ids)
+        pushed = main.build_service(stand_in_suppliers(stand_in), stream=stream, query=query)
+        assert main.dump_hotels(pushed.find(hotel_ids, destination_ids)) == main.dump_hotels(
+            full.find(hotel_ids, destination_ids)
+        )
+
+
+def test_queries_only_parse_matching_records(stand_in, payloads):
+    for supplier, name in zip(stand_in_suppliers(stand_in), ["acme", "patagonia", "paperflies"]):
+        for dto in payloads[name]:
+            parsed = supplier.parse(dto)
+            assert supplier.keys(dto) == (parsed.id, parsed.destination_id)
+
+        hotel_id = supplier.keys(payloads[name][-1])[0]
+        parse = supplier.parse
+        parsed_ids = []
+
+        def counting_parse(dto):
+            parsed_ids.append(supplier.keys(dto)[0])
+            return parse(dto)
+
+        supplier.parse = counting_parse
+        assert [hotel.id for hotel in supplier.fetch(main.HotelQuery([hotel_id]))] == parsed_ids == [hotel_id]
+
+
+@pytest.mark.parametrize("pagination", ["page", "offset"])
+def test_paginated_fetch_matches_single_response(stand_in, pagination):
+    for single, paged in zip(stand_in_suppliers(stand_in), stand_in_suppliers(stand_in, page_size=7)):
+        paged.pagination = pagination
+        expected = main.dump_hotels(single.fetch())
+        assert main.dump_hotels(paged.fetch()) == expected
+        assert main.dump_hotels(paged.iter_fetch()) == expected
+
+
+def test_cursor_pagination_follows_next_cursor(payloads):
+    pages = [payloads["acme"][i:i + 10] for i in range(0, len(payloads["acme"]), 10)]
+    requested = []
+
+    class CursorAcme(main.Acme):
+        pagination = "cursor"
+
+        @staticmethod
+        def page_items(payload):
+            return payload["items"]
+
+        def _get_page(self, params):
+            requested.append(params.get("cursor"))
+            index = int(params.get("cursor", 0))
+            return {"items": pages[index], "next_cursor": str(index + 1) if index + 1 < len(pages) else None}
+
+    hotels = CursorAcme(session=requests.Session()).fetch()
+    assert [hotel.id for hotel in hotels] == [dto["Id"] for dto in payloads["acme"]]
+    assert requested == [None] + [str(i) for i in range(1, len(pages))]
+
+
+def by_id(svc):
+    # Catalog order follows first sight, so only the merged hotels themselves are compared
+    return {hotel.id: main.hotel_to_dict(hotel) for hotel in svc.find()}
+
+
+def test_lazy_service_matches_eager(stand_in):
+    eager = main.build_service(stand_in_suppliers(stand_in))
+    lazy = main.build_service(stand_in_suppliers(stand_in), lazy=True)
+    records = {
+        hotel_id: [main.hotel_to_dict(record) for record in group]
+        for hotel_id, group in lazy._grouped.items()
+    }
+    for _ in range(2):
+        for query in random_queries(eager, count=50):
+            assert main.dump_hotels(lazy.find(*query)) == main.dump_hotels(eager.find(*query))
+    # Materializing must not leak merged state back into the supplier records
+    assert {
+        hotel_id: [main.hotel_to_dict(record) for record in group]
+        for hotel_id, group in lazy._grouped.items()
+    } == records
+
+
+def test_supplier_snapshot_order_does_not_matter(stand_in):
+    snapshots = main.fetch_snapshots(stand_in_suppliers(stand_in))
+    expected = by_id(main.build_service(stand_in_suppliers(stand_in)))
+    for order in itertools.permutations(snapshots):
+        svc = main.HotelsService()
+        for supplier, hotels, priority in order:
+            svc.apply_supplier_snapshot(supplier, hotels, priority)
+        assert by_id(svc) == expected
+
+
+def test_supplier_snapshot_refresh_matches_fresh_merge(stand_in):
+    snapshots = main.fetch_snapshots(stand_in_suppliers(stand_in))
+    svc = main.HotelsService()
+    for snapshot in snapshots:
+        svc.apply_supplier_snapshot(*snapshot)
+    supplier, hotels, priority = snapshots[1]
+    svc.apply_supplier_snapshot(supplier, hotels[::2], priority)
+
+    fresh = main.HotelsService()
+    for snapshot in [snapshots[0], (supplier, hotels[::2], priority), snapshots[2]]:
+        fresh.apply_supplier_snapshot(*snapshot)
+    assert by_id(svc) == by_id(fresh)
+
+
+@pytest.fixture
+def cached_acme(stand_in, tmp_path):
+    supplier = stand_in_suppliers(stand_in)[0]
+    supplier.cache = main.SupplierCache(str(tmp_path))
+    supplier.ttl = 0
+    return supplier
+
+
+def body_path(supplier):
+    return supplier.cache._path(supplier.endpoint(), ".json.gz")
+
+
+def test_cache_revalidates_and_refetches_unreadable_bodies(cached_acme, stand_in):
+    expected = main.dump_hotels(cached_acme.fetch())
+    with gzip.open(body_path(cached_acme)) as f:
+        assert f.read() == stand_in.bodies["acme"]
+    # ttl=0 revalidates with If-None-Match and the stand-in answers 304
+    assert main.dump_hotels(cached_acme.fetch()) == expected
+    with open(body_path(cached_acme), "wb") as f:
+        f.write(b"not gzip")
+    assert main.dump_hotels(cached_acme.fetch()) == expected
+    os.remove(body_path(cached_acme))
+    assert main.dump_hotels(cached_acme.fetch()) == expected
+
+
+def test_cache_ignores_entries_from_other_versions(cached_acme):
+    cached_acme.fetch()
+    meta_path = cached_acme.cache._path(cached_acme.endpoint(), ".meta.json")
+    with open(meta_path) as f:
+        meta = json.load(f)
+    meta.pop("version")
+    with open(meta_path, "w") as f:
+        json.dump(meta, f)
+    assert cached_acme.cache._load_meta(cached_acme.endpoint()) is None
+    cached_acme.fetch()
+    assert cached_acme.cache._load_meta(cached_acme.endpoint())["version"] == main.SupplierCache.version
+
+
+def test_streaming_through_the_cache(cached_acme, stand_in):
+    expected = main.dump_hotels(stand_in_suppliers(stand_in)[0].fetch())
+    stream = cached_acme.iter_fetch()
+    next(stream)
+    stream.close()
+    assert not os.path.exists(body_path(cached_acme))
+    assert os.listdir(cached_acme.cache.directory) == []
+
+    assert main.dump_hotels(cached_acme.iter_fetch()) == expected
+    with gzip.open(body_path(cached_acme)) as f:
+        assert f.read() == stand_in.bodies["acme"]
+    cached_acme.ttl = 300
+    assert main.dump_hotels(cached_acme.iter_fetch()) == expected
+
+
+def test_fetch_hotels_async_matches_sync(stand_in):
+    suppliers = [main.AsyncBaseSupplier(supplier) for supplier in stand_in_suppliers(stand_in)]
+    dumped = asyncio.run(main.fetch_hotels_async("none", "none", suppliers=suppliers, max_concurrency=2))
+    assert dumped == main.dump_hotels(main.build_service(stand_in_suppliers(stand_in)).find())
+
+
+class StallingHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        time.sleep(2)
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"[]")
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stalling_acme():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StallingHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    finished = []
+
+    class StallingAcme(main.Acme):
+        endpoint = staticmethod(lambda: f"http://127.0.0.1:{server.server_port}/suppliers/acme")
+
+        def fetch(self, query=None):
+            try:
+                return super().fetch(query)
+            finally:
+                finished.append(time.monotonic())
+
+    yield StallingAcme(session=main.make_session(retries=0)), finished
+    server.shutdown()
+    server.server_close()
+
+
+def test_async_deadline_also_stops_the_worker_thread(stalling_acme):
+    supplier, finished = stalling_acme
+
+    async def fetch():
+        with pytest.raises(TimeoutError):
+            await main.AsyncBaseSupplier(supplier, deadline=0.2).fetch()
+        await asyncio.sleep(0.5)
+
+    start = time.monotonic()
+    asyncio.run(fetch())
+    assert finished and finished[0] - start < 1
+
+
+def test_async_deadline_applies_to_given_suppliers(stalling_acme):
+    supplier, _ = stalling_acme
+
+    async def fetch():
+        start = time.monotonic()
+        with pytest.raises(TimeoutError):
+            await main.fetch_hotels_async("none", "none", suppliers=[main.AsyncBaseSupplier(supplier)], deadline=0.2)
+        # Without a deadline of its own the worker thread still runs on, which asyncio.run waits for on exit
+        return time.monotonic() - start
+
+    assert asyncio.run(fetch()) < 1
+
+
+class BlockingSupplier:
+    def __init__(self):
+        self.cancelled = False
+
+    async def fetch(self, query=None):
+        try:
+            await asyncio.sleep(30)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+
+
+class FailingSupplier:
+    async def fetch(self, query=None):
+        raise RuntimeError("supplier down")
+
+
+def test_async_failure_cancels_the_other_fetches():
+    blocking = BlockingSupplier()
+    with pytest.raises(RuntimeError):
+        asyncio.run(main.fetch_hotels_async("none", "none", suppliers=[blocking, FailingSupplier()]))
+    assert blocking.cancelled
+
+
+def test_async_caller_cancellation_reaches_every_fetch():
+    suppliers = [BlockingSupplier(), BlockingSupplier()]
+
+    async def cancel_soon():
+        task = asyncio.create_task(main.fetch_hotels_async("none", "none", suppliers=suppliers))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_soon())
+    assert all(supplier.cancelled for supplier in suppliers)